@@ -0,0 +1,426 @@
+"""
+Bitboard move generation, used only by `python3 perft.py --backend bitboard` as an independent cross-check of the rules of
+the piece classes (the game itself always plays through them). It counts perft nodes only about 1.6 times as fast as they do,
+as the masks are Python integers.
+
+Every square of `enchess.SQUARES` is one bit of a Python integer (bits 64 and 65 being x0 and x9), so a position comes down
+to one mask per color and piece type, and the geometry of each variant is looked up in tables computed once at import.
+Moves are made and unmade on the masks themselves, and their legality is decided by the same rule as for the piece classes
+(see `Piece._is_legal`); `python3 perft.py --check-bitboard` compares both move by move.
+"""
+
+from enchess import BOARDS, SQUARES, SQUARE_INDEX, PIECE_TYPES, KING_SQUARES, KNIGHT_SQUARES, RAYS, Pawn, Rook, Knight, Bishop, Queen, King, Auror
+
+
+COLORS = ("White", "Black")
+
+ORTHOGONAL = ((0, -1), (0, 1), (-1, 0), (1, 0))
+DIAGONAL = ((-1, -1), (1, 1), (-1, 1), (1, -1))
+
+MAIN_SQUARES = (1 << 64) - 1  # all but the "x" squares
+RANKS = {rank: 0xFF << 8 * (rank - 1) for rank in range(1, 9)}
+
+
+def _bit(square):
+	return 1 << SQUARE_INDEX[square]
+
+
+def _indices(mask):
+	"""square indices of the set bits, lowest first"""
+
+	while mask:
+		low = mask & -mask
+		yield low.bit_length() - 1
+		mask ^= low
+
+
+def _count(mask):
+	return bin(mask).count("1")
+
+
+def _tables(variant):
+	"""leaper masks, rays, and lines between squares for each square index of the variant's board"""
+
+	squares = BOARDS[variant]
+	king = [0] * len(SQUARES)
+	knight = [0] * len(SQUARES)
+	pawn_attacks = {color: [0] * len(SQUARES) for color in COLORS}
+	rays = [{} for _ in SQUARES]
+	between = [{} for _ in SQUARES]
+
+	for index, (file, rank) in enumerate(SQUARES):
+		if (file, rank) not in squares:
+			continue
+
+		for other in KING_SQUARES[variant][(file, rank)]:
+			king[index] |= _bit(other)
+
+		for other in KNIGHT_SQUARES[variant][(file, rank)]:
+			knight[index] |= _bit(other)
+
+		if file != "x":
+			for color, forward, last_rank in (("White", 1, 8), ("Black", -1, 1)):
+				for target in ((chr(ord(file) - 1), rank + forward), (chr(ord(file) + 1), rank + forward)):
+					if target in squares:
+						pawn_attacks[color][index] |= _bit(target)
+				if rank == last_rank and file in {"d", "e"} and ("x", last_rank + forward) in squares:
+					pawn_attacks[color][index] |= _bit(("x", last_rank + forward))
+
+		for direction in ORTHOGONAL + DIAGONAL:
+			ray = [SQUARE_INDEX[square] for square in RAYS[variant][(file, rank)][direction]]
+			rays[index][direction] = ray
+			passed = 0
+			for target in ray:
+				between[index][target] = (direction in DIAGONAL, passed)
+				passed |= 1 << target
+
+	return {"king": king, "knight": knight, "pawn_attacks": pawn_attacks, "rays": rays, "between": between}
+
+
+TABLES = {variant: _tables(variant) for variant in BOARDS}
+
+
+class BitboardPosition:
+	"""integer masks per color and piece type (plus the (color, piece type) occupying each square) for the given pieces, with
+	pseudo-legal move generation matching the piece classes"""
+
+	def __init__(self, pieces, variant="en"):
+		self.variant = variant
+		self.tables = TABLES[variant]
+		self.masks = {(color, piece_type): 0 for color in COLORS for piece_type in PIECE_TYPES}
+		self.occupied = {color: 0 for color in COLORS}
+		self.moved = 0
+		self.occupants = [None] * len(SQUARES)
+
+		for piece in pieces:
+			bit = _bit((piece.file, piece.rank))
+			self.occupants[SQUARE_INDEX[(piece.file, piece.rank)]] = piece.color, type(piece)
+			self.masks[(piece.color, type(piece))] |= bit
+			self.occupied[piece.color] |= bit
+			if piece.moved:
+				self.moved |= bit
+
+	def normally_possible_moves(self, index):
+		"""(destination index, interacting squares mask, *promote_class) of each move of the piece on the square before considering check"""
+
+		color, piece_type = self.occupants[index]
+
+		if piece_type is Pawn:
+			return self._pawn_moves(index, color)
+		if piece_type is Knight:
+			return self._knight_moves(index, color)
+		if piece_type is King:
+			return self._king_moves(index, color)
+		if piece_type is Auror:
+			return self._auror_moves(index, color)
+		if piece_type is Rook:
+			return self._long_range_moves(index, color, ORTHOGONAL)
+		if piece_type is Bishop:
+			return self._long_range_moves(index, color, DIAGONAL)
+		return self._long_range_moves(index, color, ORTHOGONAL + DIAGONAL)
+
+	def all_normally_possible_moves(self, color):
+		"""(origin index, destination index, interacting squares mask, *promote_class) of each move of the player before considering check"""
+
+		yield from self.pawn_pushes(color)
+
+		for index in _indices(self.occupied[color]):
+			if self.occupants[index][1] is Pawn:
+				for move in self._pawn_moves(index, color, pushes=False):
+					yield index, *move
+			else:
+				for move in self.normally_possible_moves(index):
+					yield index, *move
+
+	def legal_moves(self, color):
+		"""(origin index, destination index, interacting squares mask, *promote_class) of each legal move of the player, listing
+		each King-Auror swap once (as a move of the King)"""
+
+		check_count = self.king_checks(color)[1]
+		kings = self.masks[(color, King)]
+
+		# moves are listed up front because testing them alters the position in place
+		for origin, target, interacting, *promote_class in list(self.all_normally_possible_moves(color)):
+
+			if interacting & kings and self.occupants[origin][1] is Auror:
+				continue
+
+			# if any own kings in check, must make a move that decreases the number of own kings in check, or keep at zero if at zero
+			undo = self.make_move(origin, target, interacting, *promote_class)
+			resulting_check_count = self.king_checks(color)[1]
+			self.unmake_move(undo)
+
+			if resulting_check_count < check_count or resulting_check_count == 0:
+				yield origin, target, interacting, *promote_class
+
+	def king_checks(self, color):
+		"""(number of kings of the player, number of those in check)"""
+
+		kings = self.masks[(color, King)]
+		other_color = COLORS[color == "White"]
+
+		return _count(kings), sum(1 for index in _indices(kings) if self.attacked(index, other_color))
+
+	def make_move(self, origin, target, interacting, promote_class=None):
+		"""Apply the move (as from `all_normally_possible_moves`) in place and return an undo entry with which `unmake_move`
+		restores the position."""
+
+		moved = self.moved
+		changes = []  # (square index, occupant before)
+		color, piece_type = self.occupants[origin]
+
+		for index in _indices(interacting):
+			occupant = self.occupants[index]
+
+			if occupant[0] != color:  # captured (or passed through in Penetration mode)
+				changes.append((index, self._set(index, None)))
+
+			elif occupant[1] is Rook:  # castling
+				file, rank = SQUARES[index]
+				changes.append((index, self._set(index, None)))
+				rook_target = SQUARE_INDEX[("d" if file == "a" else "f", rank)]
+				changes.append((rook_target, self._set(rook_target, occupant)))
+
+			else:  # King-Auror swap
+				changes.append((origin, self._set(origin, occupant)))
+				changes.append((target, self._set(target, (color, piece_type))))
+				break
+
+		else:
+			changes.append((origin, self._set(origin, None)))
+			changes.append((target, self._set(target, (color, promote_class or piece_type))))
+
+		# every piece that arrived on a square has moved; captured pieces leave no mark
+		touched = 0
+		for index, _ in changes:
+			touched |= 1 << index
+		self.moved = moved & ~touched | touched & (self.occupied["White"] | self.occupied["Black"])
+
+		return changes, moved
+
+	def unmake_move(self, undo):
+		"""restore the position from before the move that produced the given undo entry (see `make_move`)"""
+
+		changes, moved = undo
+
+		for index, occupant in reversed(changes):
+			self._set(index, occupant)
+
+		self.moved = moved
+
+	def _set(self, index, occupant):
+		"""put the (color, piece type) on the square, or empty it if None, and return the occupant before"""
+
+		bit = 1 << index
+		before = self.occupants[index]
+
+		if before:
+			self.masks[before] ^= bit
+			self.occupied[before[0]] ^= bit
+		if occupant:
+			self.masks[occupant] |= bit
+			self.occupied[occupant[0]] |= bit
+		self.occupants[index] = occupant
+
+		return before
+
+	def pawn_pushes(self, color, pawns=None):
+		"""(origin index, destination index, interacting squares mask, promote class) of the forward moves of all the player's
+		Pawns (or of those in the `pawns` mask), found for all of them at once by shifting their mask"""
+
+		empty = ~(self.occupied["White"] | self.occupied["Black"]) & MAIN_SQUARES
+		if pawns is None:
+			pawns = self.masks[(color, Pawn)]
+
+		if color == "White":
+			step = 8
+			single = (pawns & ~RANKS[8]) << 8 & empty
+			double = (single & RANKS[3]) << 8 & empty
+		else:
+			step = -8
+			single = (pawns & ~RANKS[1]) >> 8 & empty
+			double = (single & RANKS[6]) >> 8 & empty
+
+		for target in _indices(single):
+			for promote_class in self._promote_options(SQUARES[target - step][1], target):
+				yield target - step, target, 0, promote_class
+
+		for target in _indices(double):
+			yield target - 2 * step, target, 0, None
+
+	def attacked(self, index, by_color, occupied=None):
+		"""whether a piece on the square could be captured by the given player (`occupied` overrides both players' occupancy)"""
+
+		tables = self.tables
+		other_color = COLORS[by_color == "White"]
+		own = self.occupied[by_color]
+		if occupied is None:
+			occupied = own | self.occupied[other_color]
+
+		# a King is never captured by an Auror, and an enemy King only threatens from an adjacent square
+		if tables["king"][index] & self.masks[(by_color, King)]\
+			or tables["knight"][index] & self.masks[(by_color, Knight)]:
+			return True
+
+		for pawn in _indices(self.masks[(by_color, Pawn)]):
+			if tables["pawn_attacks"][by_color][pawn] >> index & 1:
+				return True
+
+		for piece_type, diagonal_ok, orthogonal_ok in ((Rook, False, True), (Bishop, True, False), (Queen, True, True)):
+			for origin in _indices(self.masks[(by_color, piece_type)]):
+
+				line = tables["between"][origin].get(index)
+				if line is None or not (diagonal_ok if line[0] else orthogonal_ok):
+					continue
+
+				passed = line[1] & occupied
+				if passed & own:
+					continue
+
+				own_count, enemy_count = self._adjacent_aurors(origin, by_color)
+				if own_count < enemy_count:
+					if not line[1]:
+						return True
+				elif _count(passed) < 1 + (own_count > enemy_count):
+					return True
+
+		return False
+
+	def _adjacent_aurors(self, index, color):
+
+		if self.variant != "en":
+			return 0, 0
+
+		near = self.tables["king"][index]
+		return _count(near & self.masks[(color, Auror)]), _count(near & self.masks[(COLORS[color == "White"], Auror)])
+
+	def _promote_options(self, from_rank, index):
+		"""promote classes for a Pawn from the given rank arriving at the square (see `Pawn._move_with_promote_options`)"""
+
+		file, rank = SQUARES[index]
+
+		if rank in {1, 8}:
+			options = []
+			if self.variant == "en":
+				options += [King, Auror if from_rank == rank else None]
+			if self.variant == "standard" or from_rank == rank:
+				options += [Queen, Rook, Knight, Bishop]
+			return options
+
+		if file == "x":
+			return [King, Auror, Queen, Knight, Bishop]
+
+		return [None]
+
+	def _pawn_moves(self, index, color, pushes=True):
+
+		rank = SQUARES[index][1]
+
+		# EN only - promoting options only
+		if rank in {1, 8}:
+			for promote_class in self._promote_options(rank, index):
+				yield index, 0, promote_class
+
+		if pushes:
+			for _, target, interacting, promote_class in self.pawn_pushes(color, 1 << index):
+				yield target, interacting, promote_class
+
+		for target in _indices(self.tables["pawn_attacks"][color][index] & self.occupied[COLORS[color == "White"]]):
+			for promote_class in self._promote_options(rank, target):
+				yield target, 1 << target, promote_class
+
+	def _knight_moves(self, index, color):
+
+		enemy = self.occupied[COLORS[color == "White"]]
+
+		for target in _indices(self.tables["knight"][index] & ~self.occupied[color]):
+			yield target, enemy & 1 << target
+
+	def _king_moves(self, index, color):
+
+		own = self.occupied[color]
+		enemy = self.occupied[COLORS[color == "White"]]
+
+		for target in _indices(self.tables["king"][index] & ~own):
+			yield target, enemy & 1 << target
+
+		# auror swaps
+		for target in _indices(self.masks[(color, Auror)]):
+			yield target, 1 << target
+
+		# castling
+		if not self.moved >> index & 1 and SQUARES[index][0] != "x":
+			yield from self._castling_moves(index, color)
+
+	def _castling_moves(self, index, color):
+
+		file, rank = SQUARES[index]
+		occupied = self.occupied["White"] | self.occupied["Black"]
+		other_color = COLORS[color == "White"]
+		rooks = self.masks[(color, Rook)] & ~self.moved
+		in_check = None
+
+		for rook_file, pass_file, castle_file in (("a", "d", "c"), ("h", "f", "g")):
+
+			rook = SQUARE_INDEX[(rook_file, rank)]
+			if not rooks >> rook & 1:
+				continue
+
+			# squares strictly between the Rook and the King
+			low, high = sorted((rook, index))
+			if occupied & ((1 << high) - (1 << (low + 1))):
+				continue
+
+			if in_check is None:
+				in_check = self.attacked(index, other_color)
+			if in_check:
+				return
+
+			# cannot pass through check
+			passed = SQUARE_INDEX[(pass_file, rank)]
+			if not self.attacked(passed, other_color, occupied & ~(1 << index) | 1 << passed):
+				yield SQUARE_INDEX[(castle_file, rank)], 1 << rook
+
+	def _auror_moves(self, index, color):
+
+		occupied = self.occupied["White"] | self.occupied["Black"]
+
+		# king-like and knight-like movement without capturing
+		for target in _indices((self.tables["king"][index] | self.tables["knight"][index]) & ~occupied):
+			yield target, 0
+
+		# king swaps
+		for target in _indices(self.masks[(color, King)]):
+			yield target, 1 << target
+
+	def _long_range_moves(self, index, color, directions):
+
+		own = self.occupied[color]
+		enemy = self.occupied[COLORS[color == "White"]]
+		own_count, enemy_count = self._adjacent_aurors(index, color)
+		max_captures = 1 + (own_count > enemy_count)
+
+		for direction in directions:
+
+			ray = self.tables["rays"][index][direction]
+			if own_count < enemy_count:  # stunted mode
+				ray = ray[:1]
+
+			captures = 0
+			capture_count = 0
+
+			for target in ray:
+
+				bit = 1 << target
+				if own & bit:
+					break
+
+				if enemy & bit:
+					captures |= bit
+					capture_count += 1
+
+				yield target, captures
+
+				if capture_count == max_captures:
+					break
+
@@ -3,114 +3,328 @@ Intellectual property of Eric Nordstrom
 https://github.com/eanord4/EN-Chess
 """
 
+import bisect
+import random
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+
 
 BOARDS = {
 	"standard": {(file, rank) for file in "abcdefgh" for rank in range(1, 9)},
 	"en": {(file, rank) for file in "abcdefgh" for rank in range(1, 9)}.union({("x", 0), ("x", 9)})
 }
 
-in_play = False
+# fixed square numbering for compact representations: a1 to h8 rank by rank, then x0 and x9
+SQUARES = [(file, rank) for rank in range(1, 9) for file in "abcdefgh"] + [("x", 0), ("x", 9)]
+SQUARE_INDEX = {square: index for index, square in enumerate(SQUARES)}
+
+state = None  # the game played through the commands (see `start_game`)
+
+
+
+
+
+def _king_squares(file, rank, board):
+	"""squares of the board sharing an edge or corner with the given square (the "x" squares share a corner with their
+	neighboring d and e squares only)"""
+
+	if file == "x":
+		return [(neighbor, {0: 1, 9: 8}[rank]) for neighbor in "de"]
+
+	squares = [(chr(ord(file) + file_step), rank + rank_step) for file_step in (-1, 0, 1) for rank_step in (-1, 0, 1) if file_step or rank_step]
+	if file in {"d", "e"} and rank in {1, 8}:
+		squares.append(("x", {1: 0, 8: 9}[rank]))
+
+	return [square for square in squares if square in board]
+
+
+# squares a knight-like jump away from each "x" square
+X_KNIGHT_SQUARES = {
+	0: [("c", 1), ("d", 2), ("e", 2), ("f", 1)],
+	9: [("c", 8), ("d", 7), ("e", 7), ("f", 8)]
+}
+
+
+def _knight_squares(file, rank, board):
+	"""squares of the board a knight-like jump away from the given square"""
+
+	if file == "x":
+		return X_KNIGHT_SQUARES[rank]
 
+	squares = [(chr(ord(file) + file_step), rank + rank_step) for file_step, rank_step in (
+		(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))]
+	squares += [("x", x_rank) for x_rank in (0, 9) if (file, rank) in X_KNIGHT_SQUARES[x_rank]]
 
+	return [square for square in squares if square in board]
+
+
+# destinations of king-like and knight-like jumps (and both, for Aurors) from each square of each variant's board
+KING_SQUARES = {variant: {square: tuple(_king_squares(*square, squares)) for square in squares} for variant, squares in BOARDS.items()}
+KNIGHT_SQUARES = {variant: {square: tuple(_knight_squares(*square, squares)) for square in squares} for variant, squares in BOARDS.items()}
+AUROR_SQUARES = {
+	variant: {square: KING_SQUARES[variant][square] + KNIGHT_SQUARES[variant][square] for square in squares}
+	for variant, squares in BOARDS.items()}
+
+
+# the only ways into and out of the "x" squares along a line: (last square before the "x" square, direction) and back out
+X_ENTRIES = {(("d", 8), (1, 1)): ("x", 9), (("e", 8), (-1, 1)): ("x", 9), (("d", 1), (1, -1)): ("x", 0), (("e", 1), (-1, -1)): ("x", 0)}
+X_EXITS = {(("x", 9), (-1, -1)): ("d", 8), (("x", 9), (1, -1)): ("e", 8), (("x", 0), (-1, 1)): ("d", 1), (("x", 0), (1, 1)): ("e", 1)}
+
+
+def _ray(file, rank, direction, board):
+	"""squares of the board passed in order when moving from the given square in the given direction (file increment, rank
+	increment), bending into or out of an "x" square"""
+
+	if file == "x":
+		if ((file, rank), direction) not in X_EXITS:
+			return []
+		ray = [X_EXITS[((file, rank), direction)]]
+	else:
+		ray = []
+
+	last = ray[-1] if ray else (file, rank)
+	step = (chr(ord(last[0]) + direction[0]), last[1] + direction[1])
+
+	while step in board:
+		ray.append(step)
+		step = (chr(ord(step[0]) + direction[0]), step[1] + direction[1])
+
+	last = ray[-1] if ray else (file, rank)
+	if (last, direction) in X_ENTRIES and X_ENTRIES[(last, direction)] in board:
+		ray.append(X_ENTRIES[(last, direction)])
+
+	return ray
+
+
+# rays of long-range movement from each square of each variant's board in each direction
+RAYS = {
+	variant: {
+		square: {
+			(file_step, rank_step): tuple(_ray(*square, (file_step, rank_step), squares))
+			for file_step in (-1, 0, 1) for rank_step in (-1, 0, 1) if file_step or rank_step}
+		for square in squares}
+	for variant, squares in BOARDS.items()}
 
 
 
 class Piece:
 
+	__slots__ = ("color", "file", "rank", "moved")
+
 	def __init__(self, color, file, rank):
 		self.color = color
 		self.file = file
 		self.rank = rank
 		self.moved = False
-		self._copy = None
-		self._came_from = None
 
-	def possible_moves(self, pieces="current", board="current"):
-		"""(file, rank, interacting_pieces, *promote_cloass) of each move available to this piece"""
+	def possible_moves(self, state="current"):
+		"""(file, rank, interacting_pieces, *promote_class) of each move available to this piece"""
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
+		if state == "current":
+			state = globals()["state"]
 
-		if board == "current":
-			board = globals()["board"]
+		for move in self._legal_moves(_king_checks(self.color, state)[1], state):
+			yield move
+
+	def _legal_moves(self, checked, state):
+		"""`possible_moves` given the squares of the own kings in check"""
+
+		# moves are listed up front because testing them alters the position in place
+		for file, rank, interacting_pieces, *promote_class in list(self._normally_possible_moves(state=state)):
+			if self._is_legal(checked, file, rank, interacting_pieces, *promote_class, state=state):
+				yield file, rank, interacting_pieces, *promote_class
 
-		# if any own kings in check, must make a move that decreases the number of own kings in check, or keep at zero if at zero
+	def _is_legal(self, checked, file, rank, interacting_pieces, *promote_class, state):
+		"""whether the move (possible before considering check) is legal, given the squares of the own kings in check"""
 
-		# how many own kings in check prior to move?
-		own_check_count = 0
-		for king, check in _checks(pieces):
-			if check and king.color == self.color:
-				own_check_count += 1
+		# most moves are decided from the attack map; the rest are made to count the resulting checks
+		legal = self._legality(checked, file, rank, interacting_pieces, *promote_class, state=state)
 
-		# how many own kings in check after each move?
-		for file, rank, interacting_pieces, *promote_class in self._normally_possible_moves(pieces=pieces, board=board):
+		if legal is None:
 
+			# if any own kings in check, must make a move that decreases the number of own kings in check, or keep at zero if at zero
+			own_check_count = len(checked)
 			hypothetical_own_check_count = 0
 
-			for king, check in self._resulting_checks(file, rank, interacting_pieces, *promote_class, pieces=pieces, board=board):
+			for king, check in self._resulting_checks(file, rank, interacting_pieces, *promote_class, state=state):
 				if check and king.color == self.color:
 					hypothetical_own_check_count += 1
 
-			if hypothetical_own_check_count < own_check_count or hypothetical_own_check_count == 0:
-				yield file, rank, interacting_pieces, *promote_class
+			legal = hypothetical_own_check_count < own_check_count or hypothetical_own_check_count == 0
+
+		return legal
+
+	def _legality(self, checked, file, rank, interacting_pieces, *promote_class, state):
+		"""whether the move is legal given the squares of the own kings in check, as far as the attack map tells without making
+		the move (None if it has to be made)"""
+
+		attacks = state.board.attacks
+		origin = (self.file, self.rank)
+		other_color = ["White", "Black"][self.color == "White"]
+		promote = promote_class[0] if promote_class else None
+
+		# Auror/King swaps, castling, Penetration double captures and promotions to King are made
+		if len(interacting_pieces) > 1 or promote is King:
+			return None
+		captured = next(iter(interacting_pieces), None)
+		if captured and captured.color == self.color:
+			return None
+
+		if checked:
+			# a king in check stays in check unless a checking piece is captured, a line to the king is blocked, or an Auror
+			# comes or goes (changing the mode of Long-Range pieces)
+			if isinstance(self, (King, Auror)) or promote is Auror or isinstance(captured, Auror)\
+				or captured and not checked.isdisjoint(attacks.squares[captured])\
+				or any(piece.color == other_color for piece in attacks.watchers[(file, rank)]):
+				return None
+			return False
+
+		# otherwise the move must not open a line to an own king: only enemy Long-Range pieces that looked at the square left,
+		# or at an enemy piece captured (whose Penetration mode may then carry on through it), are affected
+		watchers = {piece for piece in attacks.watchers[origin] if piece.color == other_color}
+		if captured:
+			watchers.update(piece for piece in attacks.watchers[(file, rank)] if piece.color == other_color)
+			watchers.discard(captured)
+
+		if isinstance(self, King):
+			if watchers:
+				return None
+			return not attacks.attacked(file, rank, other_color)
+
+		if isinstance(self, Auror):
+			# leaving enemy Long-Range pieces may lift their Stunted mode or give them Penetration mode
+			if watchers or any(
+				isinstance(state.board[square], LongRangePiece) and state.board[square].color == other_color
+				for square in KING_SQUARES[state.variant][origin]):
+				return None
+			return True
+
+		if not watchers:
+			return True
+
+		# a new or captured Auror changes modes
+		if promote is Auror or isinstance(captured, Auror):
+			return None
+
+		return not any(self._pinned_by(piece, file, rank, state) for piece in watchers)
+
+	def _pinned_by(self, piece, file, rank, state):
+		"""whether the enemy Long-Range piece could capture an own king once this piece has moved to the square (through one
+		other piece in Penetration mode)"""
+
+		board = state.board
+		origin = (self.file, self.rank)
+		own_count, enemy_count = piece._adjacent_aurors(state)
+		max_captures = 1 + (own_count > enemy_count)
+
+		for direction in piece.directions:
+			ray = RAYS[state.variant][(piece.file, piece.rank)][direction]
+			captures = 0
+
+			for square in ray[:1] if own_count < enemy_count else ray:
+
+				occupant = self if square == (file, rank) else None if square == origin else board[square]
+				if occupant:
+					if occupant.color == piece.color:
+						break
+					if isinstance(occupant, King):
+						return True
+					captures += 1
+
+				if captures == max_captures:
+					break
+
+		return False
 
-	def _resulting_checks(self, file, rank, interacting_pieces, *promote_class, pieces="current", board="current"):
+	def _resulting_checks(self, file, rank, interacting_pieces, *promote_class, state="current"):
 		"""checks that would result from a hypothetical move"""
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
+		if state == "current":
+			state = globals()["state"]
+
+		# apply the move in place and take the checks before restoring the actual scenario
+		undo = self._make_move(file, rank, interacting_pieces, *promote_class, state=state)
+		checks = list(_checks(state))
+		_unmake_move(undo, state=state)
+
+		for king, check in checks:
+			yield king, check
+
+	def _make_move(self, file, rank, interacting_pieces, *promote_class, state="current"):
+		"""Apply the move in place and return an undo entry with which `_unmake_move` restores the position."""
+
+		if state == "current":
+			state = globals()["state"]
+
+		pieces, board = state.pieces, state.board
+
+		# every piece that may be displaced or captured (castling rooks and swapped pieces are among the interacting pieces)
+		involved = [(piece, piece.file, piece.rank, piece.moved) for piece in (self, *interacting_pieces)]
+		key = board.key
+
+		for piece, *_ in involved:
+			board.key ^= _piece_key(piece)
 
-		if board == "current":
-			board = globals()["board"]
+		self._move(file, rank, interacting_pieces, *promote_class, state=state)
 
-		# create hypothetical move scenario without changing actual scenario
-		hypothetical_pieces = {piece.copy() for piece in pieces}
-		hypothetical_board = {key: None for key in board}
-		hypothetical_interacting_pieces = {piece._copy for piece in interacting_pieces}
-		for piece in hypothetical_pieces:
-			hypothetical_board[(piece.file, piece.rank)] = piece
-		self._copy._move(file, rank, hypothetical_interacting_pieces, *promote_class, pieces=hypothetical_pieces, board=hypothetical_board)
+		removed = [piece for piece, *_ in involved if piece not in pieces]
+		added = [] if self in pieces else [board[(file, rank)]]  # promoted piece
 
-		# get checks in hypothetical scenario
-		for king, check in _checks(hypothetical_pieces):
-			yield king._came_from, check
+		for piece, old_file, old_rank, _ in involved:
+			if isinstance(piece, Auror):
+				board._shift_auror(piece, old_file, old_rank, -1)
+				if piece in pieces:
+					board._shift_auror(piece, piece.file, piece.rank, 1)
 
-	def _move(self, file, rank, to_capture, *promote_class, pieces="current", board="current"):
-		"""Apply the move under the assumption that it is legal. (Not to be applied unless legality has been assured.)"""
+		for piece in added:
+			if isinstance(piece, Auror):
+				board._shift_auror(piece, piece.file, piece.rank, 1)
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
+		for piece in added + [piece for piece, *_ in involved if piece in pieces]:
+			board.key ^= _piece_key(piece)
 
-		if board == "current":
-			board = globals()["board"]
+		return involved, removed, added, board.attacks.update((involved, removed, added), state), key
 
-		# update location
-		board[(self.file, self.rank)] = None
+	def _move(self, file, rank, to_capture, *promote_class, state="current"):
+		"""Apply the move under the assumption that it is legal. (Not to be applied unless legality has been assured.) Moves are
+		made through `_make_move`, which also keeps the board's attack map up to date."""
+
+		if state == "current":
+			state = globals()["state"]
+
+		pieces, board = state.pieces, state.board
+
+		# update location (unless a swapping piece has already taken over the square)
+		if board[(self.file, self.rank)] is self:
+			board[(self.file, self.rank)] = None
 		self.file = file
 		self.rank = rank
 		board[(self.file, self.rank)] = self
 
-		# remove captured pieces
+		# remove captured pieces (in Penetration mode, one of them may have been passed through rather than landed on)
 		for piece in to_capture:
 			pieces.remove(piece)
+			if board[(piece.file, piece.rank)] is piece:
+				board[(piece.file, piece.rank)] = None
 
 		# promoting
 		if promote_class and promote_class[0]:
 			pieces.remove(self)
-			new_piece = promote_class(self.color, self.file, self.rank)
-			new_piece._came_from = self
+			new_piece = promote_class[0](self.color, self.file, self.rank)
 			new_piece.moved = True
 			pieces.add(new_piece)
+			board[(self.file, self.rank)] = new_piece
 
 		# update state of having moved
 		self.moved = True
 
-	def copy(self):
-		piece = type(self)(self.color, self.file, self.rank)
-		piece.moved = self.moved
-		piece._came_from = self
-		self._copy = piece
-		return piece
+	def _attacked_squares(self, state):
+		"""(squares on which this piece could capture an enemy piece, squares whose occupants decide the former or None if only
+		this piece's own square does)"""
+
+		return set(), None
 
 	def _abbrev(self):
 		return type(self).__name__[0]
@@ -121,208 +335,130 @@ class Piece:
 
 class LongRangePiece(Piece):
 
-	def _adjacent_aurors(self, pieces="current"):
+	__slots__ = ()
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
+	def _adjacent_aurors(self, state="current"):
 
-		if variant != "en":
-			return 0, 0
+		if state == "current":
+			state = globals()["state"]
 
-		own_count = enemy_count = 0
+		aurors = state.board.aurors
+		square = (self.file, self.rank)
 
-		for piece in pieces:
-			if isinstance(piece, Auror) and abs(ord(piece.file) - ord(self.file)) < 2 and abs(piece.rank - self.rank) < 2:
-				if piece.color == self.color:
-					own_count += 1
-				else:
-					enemy_count += 1
-
-		return own_count, enemy_count
+		return aurors[self.color][square], aurors[["White", "Black"][self.color == "White"]][square]
 
-	def _iter_moves(self, direction, pieces="current", board="current"):
-		"""moves that are possible in the given direction (file increment, rank increment) before considering check"""
+	def _attacked_squares(self, state):
 
-		if board == "current":
-			board = globals()["board"]
+		squares = set()
+		scanned = set()
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
+		for direction in self.directions:
+			for file, rank, _ in self._iter_moves(direction, state, scanned):
+				squares.add((file, rank))
 
-		own_count, enemy_count = self._adjacent_aurors(pieces)
-		max_captures = 1 + (variant == "en" and own_count > enemy_count)
-		captures = set()
+		return squares, scanned
 
-		# get next square
-		if self.file == "x":
-			if self.rank == 9:
-				if direction == (-1, -1):
-					file, rank = "d", 8
-				elif direction == (1, -1):
-					file, rank = "e", 8
-				else:
-					return
-			elif self.rank == 0:
-				if direction == (-1, 1):
-					file, rank = "d", 1
-				elif direction == (1, 1):
-					file, rank = "e", 1
-				else:
-					return
-		else:
-			file = chr(ord(self.file) + direction[0])
-			rank = self.rank + direction[1]
-
-		# stunted mode (at least)
-		if (file, rank) in board:
-			
-			if board[(file, rank)]:
-				if board[(file, rank)].color == self.color:
-					return
-				else:
-					captures = {board[(file, rank)]}
-			
-			yield file, rank, captures
-
-		# standard & penetration modes
-		if own_count >= enemy_count:
+	def _normally_possible_moves(self, state="current"):
+		"""moves that are possible before considering check"""
 
-			file = chr(ord(file) + direction[0])
-			rank += direction[1]
+		if state == "current":
+			state = globals()["state"]
 
-			while len(captures) < max_captures and (file, rank) in board:
+		for direction in self.directions:
+			for move in self._iter_moves(direction, state):
+				yield move
 
-				if board[(file, rank)]:
-					if board[(file, rank)].color == self.color:
-						return
-					else:
-						captures = captures.union({board[(file, rank)]})
-				
-				yield file, rank, captures
+	def _iter_moves(self, direction, state="current", scanned=None):
+		"""moves that are possible in the given direction (file increment, rank increment) before considering check (every square
+		looked at is added to `scanned` if given)"""
 
-				file = chr(ord(file) + direction[0])
-				rank += direction[1]
+		if state == "current":
+			state = globals()["state"]
 
-		# "x" squares
-		if variant == "en" and len(captures) < max_captures and (file, rank) not in board:
+		own_count, enemy_count = self._adjacent_aurors(state)
+		for move in self._iter_ray(
+			RAYS[state.variant][(self.file, self.rank)][direction], state.board,
+			max_captures=1 + (own_count > enemy_count), stunted=own_count < enemy_count, scanned=scanned):
+			yield move
 
-			# revert to previous square
-			file = chr(ord(self.file) - direction[0])
-			rank = rank - direction[1]
+	def _iter_ray(self, ray, board, max_captures=1, stunted=False, scanned=None):
+		"""moves along the ray (see `RAYS`) capturing up to `max_captures` enemy pieces (2 in Penetration mode), or one square
+		only in Stunted mode"""
 
-			# availability of "x" squares based on location and direction
-			if rank == 8 and (
-				direction == (1, 1) and file == "d"
-				or direction == (-1, 1) and file == "e"):
+		captures = set()
 
-				if board[("x", 9)]:
-					if board[("x", 9)].color == self.color:
-						return
-					else:
-						captures = captures.union({board[("x", 9)]})
+		for square in ray[:1] if stunted else ray:
 
-				yield "x", 9, captures
+			if scanned is not None:
+				scanned.add(square)
 
-			elif rank == 1 and (
-				direction == (1, -1) and file == "d"
-				or direction == (-1, -1) and file == "e"):
+			occupant = board[square]
+			if occupant:
+				if occupant.color == self.color:
+					return
+				captures = {*captures, occupant}
 
-				if board[("x", 0)]:
-					if board[("x", 0)].color == self.color:
-						return
-					else:
-						captures = captures.union({board[("x", 0)]})
+			yield *square, captures
 
-				yield "x", 0, captures
+			if len(captures) == max_captures:
+				return
 
 
 class Pawn(Piece):
 
-	def _normally_possible_moves(self, pieces="current", board="current"):
+	__slots__ = ()
+
+	def _normally_possible_moves(self, state="current"):
 		"""moves that are possible before considering check"""
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
+		if state == "current":
+			state = globals()["state"]
 
-		if board == "current":
-			board = globals()["board"]
+		board = state.board
+		forward, start_rank, last_rank = (1, 2, 8) if self.color == "White" else (-1, 7, 1)
 
 		if self.rank in {1, 8}:  # EN only - promoting options only
-			for move in self._move_with_promote_options(self.file, self.rank, set()):
+			for move in self._move_with_promote_options(self.file, self.rank, set(), state.variant):
 				yield move
 
-		if self.color == "White":
-
-			# can move forward unless piece in the way (or promoted)
-			forward_1 = self.rank < 8  # in EN variant, can choose not to promote D and E pawns; therefore, it is possible for a pawn not to have a forward move even if no piece is in the way
-			forward_2 = self.rank == 2  # 2-square jump at start
-
-			for piece in pieces:
-
-				# capture diagonally
-				if piece.color == "Black"\
-					and abs(ord(piece.file) - ord(self.file)) == 1\
-					and piece.rank == self.rank + 1:
-
-					for move in self._move_with_promote_options(self.file, self.rank, {piece}):
-						yield move
-
-				# piece in the way
-				if piece.file == self.file:
-					if piece.rank == self.rank + 1:
-						forward_1 = forward_2 = False
-					elif piece.rank == self.rank + 2:
-						forward_2 = False
-
-				# EN only
-				if piece.rank == 9 and self.rank == 8 and self.file in {"d", "e"}:
-					for move in self._move_with_promote_options("x", 9, {piece}):
-						yield move
-
-			if forward_1:
-				for move in self._move_with_promote_options(self.file, self.rank + 1, set()):
+		# capture diagonally
+		for file in (chr(ord(self.file) - 1), chr(ord(self.file) + 1)):
+			piece = board.get((file, self.rank + forward))
+			if piece and piece.color != self.color:
+				for move in self._move_with_promote_options(file, self.rank + forward, {piece}, state.variant):
 					yield move
 
-			if forward_2:
-				yield self.file, self.rank + 2, set(), None
-
-		else:
-
-			# can move forward unless piece in the way or at end of board
-			forward_1 = self.rank > 1  # in EN variant, can choose not to promote D and E pawns; therefore, it is possible for a pawn not to have a forward move even if no piece is in the way
-			forward_2 = self.rank == 7  # 2-square jump at start
+		# EN only - capture on the "x" square from d or e on the last rank
+		if self.rank == last_rank and self.file in {"d", "e"}:
+			piece = board.get(("x", self.rank + forward))
+			if piece and piece.color != self.color:
+				for move in self._move_with_promote_options("x", self.rank + forward, {piece}, state.variant):
+					yield move
 
-			for piece in pieces:
+		# can move forward unless piece in the way (in EN, a pawn can choose not to promote, and then has no forward move at the end
+		# of the board)
+		if self.rank != last_rank and not board[(self.file, self.rank + forward)]:
 
-				# capture diagonally
-				if piece.color == "White"\
-					and abs(ord(piece.file) - ord(self.file)) == 1\
-					and piece.rank == self.rank - 1:
+			for move in self._move_with_promote_options(self.file, self.rank + forward, set(), state.variant):
+				yield move
 
-					for move in self._move_with_promote_options(piece.file, piece.rank, {piece}):
-						yield move
+			# 2-square jump at start
+			if self.rank == start_rank and not board[(self.file, self.rank + 2 * forward)]:
+				yield self.file, self.rank + 2 * forward, set(), None
 
-				# piece in the way
-				if piece.file == self.file:
-					if piece.rank == self.rank - 1:
-						forward_1 = forward_2 = False
-					elif piece.rank == self.rank - 2:
-						forward_2 = False
+	def _attacked_squares(self, state):
 
-				# EN only
-				if piece.rank == 0 and self.rank == 1 and self.file in {"d", "e"}:
-					for move in self._move_with_promote_options("x", 0, {piece}):
-						yield move
+		forward = 1 if self.color == "White" else -1
+		squares = {(chr(ord(self.file) + file_step), self.rank + forward) for file_step in (-1, 1)}
 
-			if forward_1:
-				for move in self._move_with_promote_options(self.file, self.rank - 1, set()):
-					yield move
+		# EN only
+		if self.file in {"d", "e"} and self.rank == {1: 8, -1: 1}[forward]:
+			squares.add(("x", self.rank + forward))
 
-			if forward_2:
-				yield self.file, self.rank - 2, set(), None
+		return {square for square in squares if square in state.board}, None
 
-	def _move_with_promote_options(self, file, rank, to_capture):
-		"""yield all versions of the move with promote options where necessary (otherwise keep as the same single move)"""
+	def _move_with_promote_options(self, file, rank, to_capture, variant):
+		"""yield all versions of the move with promote options of the variant where necessary (otherwise keep as the same single move)"""
 
 		if rank in {1, 8}:
 
@@ -356,18 +492,8 @@ class Pawn(Piece):
 
 class Rook(LongRangePiece):
 
-	def _normally_possible_moves(self, pieces="current", board="current"):
-		"""moves that are possible before considering check"""
-
-		if pieces == "current":
-			pieces = globals()["pieces"]
-
-		if board == "current":
-			board = globals()["board"]
-
-		for direction in ((0, -1), (0, 1), (-1, 0), (1, 0)):
-			for move in self._iter_moves(direction, pieces, board):
-				yield move
+	__slots__ = ()
+	directions = ((0, -1), (0, 1), (-1, 0), (1, 0))
 
 	def __str__(self):
 		if self.color == "Black":
@@ -377,48 +503,28 @@ class Rook(LongRangePiece):
 
 class Knight(Piece):
 
-	def _normally_possible_moves(self, pieces="current", board="current"):
-		"""moves that are possible before considering check"""
-
-		if pieces == "current":
-			pieces = globals()["pieces"]
-
-		if board == "current":
-			board = globals()["board"]
-
-		x_accessible_squares = {
-			0: [("c", 1), ("d", 2), ("e", 2), ("f", 1)],
-			9: [("c", 8), ("d", 7), ("e", 7), ("f", 8)]
-		}
-
-		if self.file == "x":
-			for file, rank in x_accessible_squares[self.rank]:
+	__slots__ = ()
 
-				piece = board[(file, rank)]
+	def _attacked_squares(self, state):
+		return KNIGHT_SQUARES[state.variant][(self.file, self.rank)], None
 
-				if piece:
-					if piece.color != self.color:
-						yield file, rank, {piece}
-				else:
-					yield file, rank, set()
-
-		else:
+	def _normally_possible_moves(self, state="current"):
+		"""moves that are possible before considering check"""
 
-			available_squares = BOARDS[variant].copy()
+		if state == "current":
+			state = globals()["state"]
 
-			for piece in pieces:
-				if abs((piece.rank - self.rank) * (ord(piece.file) - ord(self.file))) == 2\
-					or piece.file == "x" and (self.file, self.rank) in x_accessible_squares[piece.rank]:
+		board = state.board
 
-					if piece.color != self.color:
-						yield piece.file, piece.rank, {piece}
+		for file, rank in KNIGHT_SQUARES[state.variant][(self.file, self.rank)]:
 
-					available_squares.remove((piece.file, piece.rank))
+			piece = board[(file, rank)]
 
-			for square in available_squares:
-				if abs((square[1] - self.rank) * (ord(square[0]) - ord(self.file))) == 2\
-					or square[0] == "x" and (self.file, self.rank) in x_accessible_squares[square[1]]:
-					yield *square, set()
+			if piece:
+				if piece.color != self.color:
+					yield file, rank, {piece}
+			else:
+				yield file, rank, set()
 
 	def __str__(self):
 		if self.color == "Black":
@@ -428,18 +534,8 @@ class Knight(Piece):
 
 class Bishop(LongRangePiece):
 
-	def _normally_possible_moves(self, pieces="current", board="current"):
-		"""moves that are possible before considering check"""
-
-		if pieces == "current":
-			pieces = globals()["pieces"]
-
-		if board == "current":
-			board = globals()["board"]
-
-		for direction in ((-1, -1), (1, 1), (-1, 1), (1, -1)):
-			for move in self._iter_moves(direction, pieces, board):
-				yield move
+	__slots__ = ()
+	directions = ((-1, -1), (1, 1), (-1, 1), (1, -1))
 
 	def __str__(self):
 		if self.color == "Black":
@@ -449,22 +545,8 @@ class Bishop(LongRangePiece):
 
 class Queen(LongRangePiece):
 
-	def _normally_possible_moves(self, pieces="current", board="currrent"):
-		"""moves that are possible before considering check"""
-
-		if pieces == "current":
-			pieces = globals()["pieces"]
-
-		if board == "current":
-			board = globals()["board"]
-		
-		# orthogonal movement
-		for move in Rook(self.color, self.file, self.rank)._normally_possible_moves(pieces=pieces, board=board):
-			yield move
-
-		# diagonal movement
-		for move in Bishop(self.color, self.file, self.rank)._normally_possible_moves(pieces=pieces, board=board):
-			yield move
+	__slots__ = ()
+	directions = Rook.directions + Bishop.directions
 
 	def __str__(self):
 		if self.color == "Black":
@@ -474,13 +556,15 @@ class Queen(LongRangePiece):
 
 class King(Piece):
 
-	def _move(self, file, rank, interacting_pieces, pieces="current", board="current"):
+	__slots__ = ()
+
+	def _attacked_squares(self, state):
+		return KING_SQUARES[state.variant][(self.file, self.rank)], None
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
+	def _move(self, file, rank, interacting_pieces, state="current"):
 
-		if board == "current":
-			board = globals()["board"]
+		if state == "current":
+			state = globals()["state"]
 
 		# special moves
 		to_capture = interacting_pieces.copy()
@@ -490,92 +574,47 @@ class King(Piece):
 				# castling
 				if isinstance(piece, Rook):
 					if piece.file == "a":
-						piece._move("d", self.rank, set(), pieces=pieces, board=board)
+						piece._move("d", self.rank, set(), state=state)
 					else:
-						piece._move("f", self.rank, set(), pieces=pieces, board=board)
+						piece._move("f", self.rank, set(), state=state)
 
 				# auror swaps
 				if isinstance(piece, Auror):
-					piece._move(self.file, self.rank, set(), pieces=pieces, board=board)
+					piece._move(self.file, self.rank, set(), state=state)
 
 				to_capture.remove(piece)
 
-		Piece._move(self, file, rank, to_capture, pieces=pieces, board=board)
+		Piece._move(self, file, rank, to_capture, state=state)
 		self.moved = True
 
-	def _normally_possible_moves(self, pieces="current", board="current"):
+	def _normally_possible_moves(self, state="current"):
 		"""moves that are possible before considering resulting checks"""
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
-
-		if board == "current":
-			board = globals()["board"]
-		
-		available_squares = BOARDS[variant].copy()  # for normal king movement
-
-		if self.file == "x":
-
-			queenside_clear_for_castle = kingside_clear_for_castle = False
+		if state == "current":
+			state = globals()["state"]
 
-			if self.rank == 0:
+		pieces, board = state.pieces, state.board
 
-				for piece in pieces:
-					if piece.rank == 1 and piece.file in "de":
-						if piece.color != self.color:
-							yield piece.file, piece.rank, {piece}
-						available_squares.remove((piece.file, piece.rank))
+		# normal king movement
+		for file, rank in KING_SQUARES[state.variant][(self.file, self.rank)]:
 
-				for square in available_squares:
-					if square[1] == 1 and square[0] in "de":
-						yield *square, set()
+			piece = board[(file, rank)]
 
-			elif self.rank == 9:
-
-				for piece in pieces:
-					if piece.rank == 8 and piece.file in "de":
-						if piece.color != self.color:
-							yield piece.file, piece.rank, {piece}
-						available_squares.remove((piece.file, piece.rank))
-
-				for square in available_squares:
-					if square[1] == 8 and square[0] in "de":
-						yield *square, set()
+			if piece:
+				if piece.color != self.color:
+					yield file, rank, {piece}
+			else:
+				yield file, rank, set()
 
+		# castling needs the squares between the King and the Rook to be empty
+		if self.file == "x":
+			queenside_clear_for_castle = kingside_clear_for_castle = False
 		else:
+			queenside_clear_for_castle = not any(board[(file, self.rank)] for file in "bcdefg" if file < self.file)
+			kingside_clear_for_castle = not any(board[(file, self.rank)] for file in "bcdefg" if file > self.file)
 
-			queenside_clear_for_castle = kingside_clear_for_castle = True
-
-			for piece in pieces:
-
-				if abs(piece.rank - self.rank) < 2\
-					and abs(ord(piece.file) - ord(self.file)) < 2\
-					or piece.file == "x" and self.file in "de" and (
-						piece.rank == 0 and self.rank == 1
-						or piece.rank == 9 and self.rank == 8):
-
-					if piece.color != self.color:
-						yield piece.file, piece.rank, {piece}
-
-					available_squares.remove((piece.file, piece.rank))
-
-				if piece.rank == self.rank and not(piece.color == self.color and piece.file in "ah"):
-					if piece.file < self.file:
-						queenside_clear_for_castle = False
-					elif piece.file > self.file:
-						kingside_clear_for_castle = False
-
-			for square in available_squares:
-				if abs(square[1] - self.rank) < 2\
-					and abs(ord(square[0]) - ord(self.file)) < 2\
-					or square[0] == "x" and (
-						square[1] == 0 and self.rank == 1 and self.file in "de"
-						or square[1] == 9 and self.rank == 8 and self.file in "de"):
-
-					yield *square, set()
-
-		# special moves
-		for piece in pieces:
+		# special moves (listed up front as checking for castling alters the position in place)
+		for piece in list(pieces):
 
 			# auror swaps
 			if isinstance(piece, Auror) and piece.color == self.color:
@@ -587,7 +626,7 @@ class King(Piece):
 				# must rule out checks that do not result from the final state of the move (namely passing through check or castling out of check)
 				
 				# currently in check?
-				for king, check in _checks(pieces):
+				for king, check in _checks(state):
 					if check and king is self:
 						break
 
@@ -595,14 +634,14 @@ class King(Piece):
 				else:
 
 					if piece.file == "a" and queenside_clear_for_castle:
-						for king, check in self._resulting_checks("d", self.rank, set(), pieces=pieces):
+						for king, check in self._resulting_checks("d", self.rank, set(), state=state):
 							if check and king is self:
 								break
 						else:
 							yield "c", self.rank, {piece}
 
 					elif piece.file == "h" and kingside_clear_for_castle:
-						for king, check in self._resulting_checks("f", self.rank, set(), pieces=pieces):
+						for king, check in self._resulting_checks("f", self.rank, set(), state=state):
 							if check and king is self:
 								break
 						else:
@@ -616,48 +655,35 @@ class King(Piece):
 
 class Auror(Piece):
 
-	def _normally_possible_moves(self, pieces="current", board="current"):
+	__slots__ = ()
+
+	def _normally_possible_moves(self, state="current"):
 		"""moves that are possible before considering check"""
 
-		if pieces == "current":
-			pieces = globals()["pieces"]
-
-		if board == "current":
-			board = globals()["board"]
-
-		own_auror_locations = {(piece.file, piece.rank) for piece in pieces
-			if isinstance(piece, Auror)
-			and piece.color == self.color}
-		
-		# king-like movement without capturing or auror swaps
-		hypothetical_king = King(self.color, self.file, self.rank)
-		hypothetical_king.moved = True
-		for move in hypothetical_king._normally_possible_moves(pieces=pieces, board=board):
-			if not move[2] and move[:2] not in own_auror_locations:
-				yield move
+		if state == "current":
+			state = globals()["state"]
 
-		# knight-like movement without capturing
-		for move in Knight(self.color, self.file, self.rank)._normally_possible_moves(pieces=pieces, board=board):
-			if not move[2]:
-				yield move
+		board = state.board
+
+		# king-like and knight-like movement without capturing
+		for file, rank in AUROR_SQUARES[state.variant][(self.file, self.rank)]:
+			if not board[(file, rank)]:
+				yield file, rank, set()
 
 		# king swaps
-		for piece in pieces:
+		for piece in state.pieces:
 			if isinstance(piece, King) and piece.color == self.color:
 				yield piece.file, piece.rank, {piece}
 
-	def _move(self, file, rank, king_to_swap, pieces="current", board="current"):
-
-		if pieces == "current":
-			pieces = globals()["pieces"]
+	def _move(self, file, rank, king_to_swap, state="current"):
 
-		if board == "current":
-			board = globals()["board"]		
+		if state == "current":
+			state = globals()["state"]
 
-		if king_to_swap:
-			king_to_swap.pop()._move(self.file, self.rank, set(), pieces=pieces, board=board)
+		for king in king_to_swap:
+			king._move(self.file, self.rank, set(), state=state)
 
-		Piece._move(self, file, rank, set(), pieces=pieces, board=board)
+		Piece._move(self, file, rank, set(), state=state)
 
 	def __str__(self):
 		if self.color == "Black":
@@ -670,6 +696,262 @@ class Auror(Piece):
 
 
 
+PIECE_TYPES = (Pawn, Rook, Knight, Bishop, Queen, King, Auror)
+
+
+# random 64-bit keys for Zobrist hashing: one per color, piece type, and square, one more per square for a King or Rook that
+# has not moved (the castling rights), and one for Black to move
+_zobrist_random = random.Random(20210815)
+ZOBRIST_PIECE_KEYS = {
+	(color, piece_type, square): _zobrist_random.getrandbits(64)
+	for color in ("White", "Black") for piece_type in PIECE_TYPES for square in SQUARES}
+ZOBRIST_UNMOVED_KEYS = {(color, square): _zobrist_random.getrandbits(64) for color in ("White", "Black") for square in SQUARES}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+def _piece_key(piece):
+	"""Zobrist key of the piece on its square, including its castling rights if it is a King or Rook that has not moved (a Pawn
+	waiting on its last rank needs nothing more, as its square alone grants it the option to promote)"""
+
+	key = ZOBRIST_PIECE_KEYS[(piece.color, type(piece), (piece.file, piece.rank))]
+
+	if not piece.moved and isinstance(piece, (King, Rook)):
+		key ^= ZOBRIST_UNMOVED_KEYS[(piece.color, (piece.file, piece.rank))]
+
+	return key
+
+
+def _position_key(state="current"):
+	"""Zobrist key of the position on the board with the player to move"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	return state.board.key ^ ZOBRIST_BLACK_TO_MOVE if state.turn == "Black" else state.board.key
+
+
+class AttackMap:
+	"""squares on which each piece could capture, and on how many of them each player could capture on each square"""
+
+	def __init__(self, state):
+		board = state.board
+		self.squares = {}  # piece: attacked squares
+		self.scanned = {}  # long-range piece: squares its attacked squares depend on
+		self.watchers = {square: set() for square in board}  # square: long-range pieces that scanned it
+		self.counts = {"White": dict.fromkeys(board, 0), "Black": dict.fromkeys(board, 0)}
+
+		for piece in state.pieces:
+			self._add(piece, *piece._attacked_squares(state))
+
+	def attacked(self, file, rank, by_color):
+		"""whether the player could capture a piece on the square"""
+		return self.counts[by_color][(file, rank)] > 0
+
+	def update(self, undo, state):
+		"""Bring the map up to date after the move of the undo entry (see `Piece._make_move`) and return the record with which
+		`restore` takes it back."""
+
+		involved, removed, added, *_ = undo
+		board = state.board
+
+		# squares whose occupants changed, and those next to which an Auror came or went (affecting Penetration and Stunted modes)
+		changed = set()
+		auror_squares = set()
+
+		for piece, file, rank, _ in involved:
+			changed.update({(file, rank), (piece.file, piece.rank)})
+			if isinstance(piece, Auror):
+				auror_squares.update({(file, rank), (piece.file, piece.rank)})
+
+		for piece in added:
+			changed.add((piece.file, piece.rank))
+			if isinstance(piece, Auror):
+				auror_squares.add((piece.file, piece.rank))
+
+		# pieces whose attacked squares may have changed
+		to_update = {piece for piece, *_ in involved}.union(added)
+
+		for square in changed:
+			to_update.update(self.watchers[square])
+
+		for square in auror_squares:
+			for neighbor in KING_SQUARES[state.variant][square]:
+				if isinstance(board[neighbor], LongRangePiece):
+					to_update.add(board[neighbor])
+
+		record = []
+		for piece in to_update:
+			record.append((piece, self.squares.get(piece), self.scanned.get(piece)))
+			self._remove(piece)
+			if piece in state.pieces:
+				self._add(piece, *piece._attacked_squares(state))
+
+		return record
+
+	def restore(self, record):
+		"""take back an `update`"""
+
+		for piece, squares, scanned in record:
+			self._remove(piece)
+			if squares is not None:
+				self._add(piece, squares, scanned)
+
+	def _add(self, piece, squares, scanned):
+
+		self.squares[piece] = squares
+		counts = self.counts[piece.color]
+		for square in squares:
+			counts[square] += 1
+
+		if scanned is not None:
+			self.scanned[piece] = scanned
+			for square in scanned:
+				self.watchers[square].add(piece)
+
+	def _remove(self, piece):
+
+		if piece not in self.squares:
+			return
+
+		counts = self.counts[piece.color]
+		for square in self.squares.pop(piece):
+			counts[square] -= 1
+
+		for square in self.scanned.pop(piece, ()):
+			self.watchers[square].discard(piece)
+
+
+class Board(dict):
+	"""occupant (or None) of each square, along with the position's `AttackMap`, Zobrist key without the player to move, and
+	count of each player's Aurors next to each square (all kept up to date by `Piece._make_move` and `_unmake_move`)"""
+
+	attacks = None
+	key = 0
+	aurors = None  # color: {square: adjacent Aurors of that color}
+	neighbors = None  # `KING_SQUARES` of the board's variant
+
+	def _shift_auror(self, auror, file, rank, change):
+		"""add `change` to the Auror counts of the squares next to the given one for the Auror's color"""
+
+		counts = self.aurors[auror.color]
+		for square in self.neighbors[(file, rank)]:
+			counts[square] += change
+
+
+
+
+
+
+
+class TranspositionTable:
+	"""Fixed number of entries for results about positions, looked up by Zobrist key (see `_position_key`).
+
+	Each key maps to a bucket of two entries: one kept for the deepest result (unless it is left from before the last call to
+	`new_generation`) and one always replaced."""
+
+	def __init__(self, size=1 << 16):
+		self.mask = (1 << max(size // 2, 1).bit_length() - 1) - 1  # buckets of two entries, rounded down to a power of two
+		self.entries = [None] * (2 * (self.mask + 1))  # (key, depth, generation, value)
+		self.generation = 0
+
+	def new_generation(self):
+		"""mark the stored results as replaceable regardless of depth (e.g. at the start of each search)"""
+		self.generation += 1
+
+	def store(self, key, value, depth=0):
+
+		index = (key & self.mask) << 1
+		kept = self.entries[index]
+
+		if kept is None or kept[0] == key or depth >= kept[1] or kept[2] != self.generation:
+			self.entries[index] = key, depth, self.generation, value
+		else:
+			self.entries[index + 1] = key, depth, self.generation, value
+
+	def probe(self, key, depth=0):
+		"""value stored for the key with at least the given depth, or None"""
+
+		index = (key & self.mask) << 1
+
+		for entry in self.entries[index:index + 2]:
+			if entry is not None and entry[0] == key and entry[1] >= depth:
+				return entry[3]
+
+	def clear(self):
+		self.entries = [None] * len(self.entries)
+		self.generation = 0
+
+
+class MoveCache:
+	"""Possible moves and check status of the most recently used positions (see `_position_key`), so that validating a move and
+	the listing and display commands generate them once per position; counts hits and misses. One cache serves every game of
+	the process, and may be used from several threads at once as long as each game is used by one thread at a time (testing
+	moves makes and unmakes them on the game's board)."""
+
+	def __init__(self, size=256):
+		self.size = size
+		self.entries = OrderedDict()  # (variant, key): (move codes of the player to move by origin square, (king square, check) pairs)
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	def lookup(self, state):
+		"""(move codes of each piece of the player to move by square, the check status of each king by square) for the game's
+		position; swaps are listed for both pieces"""
+
+		key = state.variant, _position_key(state)
+
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None:
+				self.hits += 1
+				self.entries.move_to_end(key)
+				return entry
+			self.misses += 1
+
+		# generated outside the lock: this makes and unmakes moves on the game's own board only, which the caller must not share
+		# with other threads meanwhile
+		checks = {(king.file, king.rank): check for king, check in _checks(state)}
+		checked = {square for square, check in checks.items() if check and state.board[square].color == state.turn}
+		codes = {}
+
+		for piece in sorted(state.pieces, key=lambda piece: SQUARE_INDEX[(piece.file, piece.rank)]):
+			if piece.color == state.turn:
+				codes[(piece.file, piece.rank)] = [_encode_move(piece, *move) for move in piece._legal_moves(checked, state)]
+
+		entry = codes, checks
+
+		with self.lock:
+			self.entries[key] = entry
+			self._evict()
+
+		return entry
+
+	def resize(self, size):
+		"""keep up to the given number of positions from now on (dropping the least recently used ones over it)"""
+
+		with self.lock:
+			self.size = size
+			self._evict()
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.hits = self.misses = 0
+
+	def _evict(self):
+		while len(self.entries) > self.size:
+			self.entries.popitem(last=False)
+
+
+move_cache = MoveCache()
+
+
+
+
+
+
+
 def _init_pieces(variant="standard"):
 
 	if variant == "en":
@@ -685,55 +967,250 @@ def _init_pieces(variant="standard"):
 				King("White", "e", 1), King("Black", "e", 8)})
 
 
-def _init_board(variant="standard"):
+def _init_board(variant="standard", pieces=()):
+	"""board of the variant holding the pieces (without its attack map, which needs the game; see `GameState`)"""
 	
-	board = {loc: None for loc in BOARDS[variant]}
+	board = Board({loc: None for loc in BOARDS[variant]})
+	board.aurors = {"White": dict.fromkeys(board, 0), "Black": dict.fromkeys(board, 0)}
+	board.neighbors = KING_SQUARES[variant]
 
 	for piece in pieces:
 		board[(piece.file, piece.rank)] = piece
+		board.key ^= _piece_key(piece)
+		if isinstance(piece, Auror):
+			board._shift_auror(piece, piece.file, piece.rank, 1)
 
 	return board
 
 
+class GameState:
+	"""One game: its variant, pieces, board, player to move, whether it is still in play, how many turns have been played, the
+	moves played and taken back (see `undo`), and the position in notation they were played from. Every function of a game takes it as `state`, which defaults to the game played
+	through the commands."""
+
+	def __init__(self, variant="en", pieces=None, turn="White"):
+		self.variant = variant.lower()
+		self.pieces = _init_pieces(self.variant) if pieces is None else pieces
+		self.board = _init_board(self.variant, self.pieces)
+		self.board.attacks = AttackMap(self)
+		self.turn = turn
+		self.in_play = True
+		self.turn_count = 0  ### future: add value counts (auror?)
+		self.history = []  # (move code, undo entry, player to move before, player to move after, in play after) of each move played
+		self.undone = []  # (move code, player to move after, in play after) of each move taken back, the latest last
+		self.start_notation = position_notation(self)  # the position the moves of `history` were played from
+
+
 def start_game(game_variant="en"):
-	global pieces, board, turn, variant, in_play, turn_count  ### future: change into a list of moves; add value counts (auror?)
-	variant = game_variant.lower()
-	pieces = _init_pieces(variant)
-	board = _init_board(variant)
-	turn = "White"
-	in_play = True
-	turn_count = 0
-	display_board()
+	global state
+	state = GameState(game_variant)
+	_show_board(state)
 	print("White to move.")
 
 
-def move(piece_loc, destination_loc, *promote_class):
-	global in_play, turn
+def _compact_position(state="current"):
+	"""the game as nested tuples of strings, integers and booleans, small to pickle (e.g. for another process): the variant, the
+	player to move, and (piece type index in `PIECE_TYPES`, color, file, rank, moved) for each piece"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	return state.variant, state.turn, tuple(sorted(
+		(PIECE_TYPES.index(type(piece)), piece.color, piece.file, piece.rank, piece.moved) for piece in state.pieces))
+
+
+def _expand_position(position):
+	"""new game from `_compact_position`"""
+
+	variant, turn, compact_pieces = position
+	pieces = set()
+
+	for type_index, color, file, rank, moved in compact_pieces:
+		piece = PIECE_TYPES[type_index](color, file, rank)
+		piece.moved = moved
+		pieces.add(piece)
+
+	return GameState(variant, pieces, turn)
+
+
+# Position notation, like FEN: the ranks from 8 down to 1 separated by slashes (between x9 and x0 in EN), each listing its
+# pieces by letter (White in capitals) and its runs of empty squares by count; "w" or "b" for the player to move; and the
+# files of the Kings and Rooks that are on their starting squares and have not moved (White's in capitals: "E" for the King,
+# "A" and "H" for the Rooks), or "-". Other pieces count as having moved unless
+# on a starting square. The EN start is "a/rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR/A w AEHaeh".
+PIECE_LETTERS = "PRNBQKA"  # of each of `PIECE_TYPES`
+NOTATION_PIECES = {
+	letter if color == "White" else letter.lower(): (type_index, color)
+	for type_index, letter in enumerate(PIECE_LETTERS) for color in ("White", "Black")
+}
+NOTATION_LETTERS = {(PIECE_TYPES[type_index], color): char for char, (type_index, color) in NOTATION_PIECES.items()}
+NOTATION_ROWS = {
+	"standard": [[(file, rank) for file in "abcdefgh"] for rank in range(8, 0, -1)],
+	"en": [[("x", 9)]] + [[(file, rank) for file in "abcdefgh"] for rank in range(8, 0, -1)] + [[("x", 0)]]
+}
+START_PIECES = {
+	variant: {(PIECE_TYPES.index(type(piece)), piece.color, piece.file, piece.rank) for piece in _init_pieces(variant)}
+	for variant in BOARDS
+}
+UNMOVED_FILES = {"a": Rook, "e": King, "h": Rook}  # starting files of the pieces listed as not having moved
+
+
+def position_notation(state="current"):
+	"""the position of the game in notation (see `PIECE_LETTERS`)"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	board = state.board
+	rows = []
+	unmoved = {"White": "", "Black": ""}
 
-	if not in_play:
+	for squares in NOTATION_ROWS[state.variant]:
+
+		row = ""
+		empty = 0
+
+		for square in squares:
+			piece = board[square]
+
+			if piece is None:
+				empty += 1
+				continue
+
+			if empty:
+				row += str(empty)
+				empty = 0
+
+			row += NOTATION_LETTERS[(type(piece), piece.color)]
+
+			if not piece.moved and UNMOVED_FILES.get(square[0]) is type(piece)\
+				and (PIECE_TYPES.index(type(piece)), piece.color, *square) in START_PIECES[state.variant]:
+				unmoved[piece.color] += square[0]
+
+		if empty:
+			row += str(empty)
+		rows.append(row)
+
+	unmoved = "".join(sorted(unmoved["White"].upper())) + "".join(sorted(unmoved["Black"]))
+
+	return f"{'/'.join(rows)} {state.turn[0].lower()} {unmoved or '-'}"
+
+
+def _parse_notation(notation):
+	"""the position in notation (see `PIECE_LETTERS`) as `_compact_position`, without building the game"""
+
+	try:
+		placement, turn, unmoved = notation.split()
+	except ValueError:
+		raise ValueError(f"Expected 3 fields in {notation!r}!") from None
+
+	rows = placement.split("/")
+	variant = {8: "standard", 10: "en"}.get(len(rows))
+
+	if variant is None or turn not in {"w", "b"}:
+		raise ValueError(f"Not a position: {notation!r}!")
+
+	start = START_PIECES[variant]
+	compact_pieces = []
+
+	# Kings and Rooks on their starting squares that have not moved
+	unmoved_pieces = set()
+	for char in "" if unmoved == "-" else unmoved:
+		color = "White" if char.isupper() else "Black"
+		piece_type = UNMOVED_FILES.get(char.lower())
+		piece = piece_type and (PIECE_TYPES.index(piece_type), color, char.lower(), 1 if color == "White" else 8)
+		if piece not in start or piece in unmoved_pieces:
+			raise ValueError(f"Not a list of unmoved Kings and Rooks: {unmoved!r}!")
+		unmoved_pieces.add(piece)
+
+	for squares, row in zip(NOTATION_ROWS[variant], rows):
+
+		index = 0
+		for char in row:
+
+			if char.isdigit():
+				index += int(char)
+				continue
+
+			if char not in NOTATION_PIECES or index >= len(squares):
+				raise ValueError(f"Not a rank: {row!r}!")
+
+			type_index, color = NOTATION_PIECES[char]
+			file, rank = squares[index]
+
+			# Rooks have no way onto the x squares, and Pawns none onto them or their own back rank (nor, in the standard
+			# variant, onto the last rank, where they promote at once)
+			if PIECE_TYPES[type_index] in {Rook, Pawn} and file == "x" or PIECE_TYPES[type_index] is Pawn and (
+				rank == (1 if color == "White" else 8) or variant == "standard" and rank in {1, 8}):
+				raise ValueError(f"No {color} {PIECE_TYPES[type_index].__name__} can stand on {file}{rank}!")
+
+			if PIECE_TYPES[type_index] in {Rook, King}:
+				moved = (type_index, color, file, rank) not in unmoved_pieces
+				unmoved_pieces.discard((type_index, color, file, rank))
+			else:
+				moved = (type_index, color, file, rank) not in start
+
+			compact_pieces.append((type_index, color, file, rank, moved))
+			index += 1
+
+		if index != len(squares):
+			raise ValueError(f"Not a rank: {row!r}!")
+
+	if unmoved_pieces:
+		raise ValueError(f"No King or Rook to match {unmoved!r} on its starting square!")
+
+	return variant, "White" if turn == "w" else "Black", tuple(sorted(compact_pieces))
+
+
+def parse_position(notation):
+	"""new game (see `GameState`) from the position in notation (see `PIECE_LETTERS`)"""
+	return _expand_position(_parse_notation(notation))
+
+
+def load_game(*notation):
+	"""Start a game from the position in notation (fields separated by spaces, see `show_position`)."""
+
+	global state
+	state = parse_position(" ".join(notation))
+	_start_turn(state)
+	state.start_notation = position_notation(state)  # after a turn lost to partial checkmate
+
+
+def show_position(state="current"):
+	"""Print the position in notation."""
+	print(position_notation(state))
+
+
+def move(piece_loc, destination_loc, *promote_class, state="current"):
+
+	if state == "current":
+		state = globals()["state"]
+
+	if state is None or not state.in_play:
 		raise RuntimeError("You haven't started a game yet!")
 
-	piece = board[(piece_loc[0], int(piece_loc[1]))]
+	piece = state.board[(piece_loc[0], int(piece_loc[1]))]
 	if not piece:
 		raise ValueError("There's no piece there!")
 
-	if piece.color != turn:
-		raise ValueError(f"It's {turn}'s turn!")
+	if piece.color != state.turn:
+		raise ValueError(f"It's {state.turn}'s turn!")
 
-	for file, rank, interacting_pieces, *move_promote_class in piece.possible_moves():
+	for code in _piece_move_codes(piece, state):
+		_, file, rank, interacting_pieces, *move_promote_class = _decode_move(code, state)
 		if file == destination_loc[0] and rank == int(destination_loc[1]) and (
 			promote_class in {(None,), tuple()} and tuple(move_promote_class) in {(None,), tuple()}
-			or promote_class and move_promote_class and promote_class[0].title() == move_promote_class[0].__name__):
+			or promote_class and move_promote_class and move_promote_class[0] and promote_class[0].title() == move_promote_class[0].__name__):
 
-			piece._move(file, rank, interacting_pieces, *move_promote_class)
+			undo_entry = piece._make_move(file, rank, interacting_pieces, *move_promote_class, state=state)
 			print(f"{type(piece).__name__} moved to {destination_loc}.")
 
 			for interacting_piece in interacting_pieces:
 				if interacting_piece.color != piece.color:
 					print(f"{type(interacting_piece).__name__} captured.")
 
-			if promote_class and promote_class[0]:
-				print(f"{type(piece).__name__} promoted to {promote_class[0].__name__}!")
+			if move_promote_class and move_promote_class[0]:
+				print(f"{type(piece).__name__} promoted to {move_promote_class[0].__name__}!")
 
 			### future: announce checks?
 
@@ -744,155 +1221,452 @@ def move(piece_loc, destination_loc, *promote_class):
 
 	print()
 
-	turn = ["White", "Black"][turn == "White"]
+	previous_turn = state.turn
+	state.turn = ["White", "Black"][state.turn == "White"]
+	state.turn_count += 1
+
+	_start_turn(state)
+
+	state.history.append((code, undo_entry, previous_turn, state.turn, state.in_play))
+	state.undone.clear()
+
 
-	for move in _all_possible_moves():
-		display_board(perspective=turn)
-		print(f"{turn} to move.")
-		break
+def _start_turn(state):
+	"""show the board to the player to move, or announce the end of the game; a player in partial checkmate loses the turn"""
 
+	status = game_status(state)
+
+	if status == "ongoing":
+		_show_board(state)
+		print(f"{state.turn} to move.")
+
+	# no possible moves; differentiate between checkmate, stalemate, and partial checkmate
+	elif status == "stalemate":
+		print("Draw by stalemate!!!")
+		_show_board(state)
+		print("Draw by stalemate!!!")
+		state.in_play = False
+	elif status == "partial checkmate":
+		king_count, checked = _king_checks(state.turn, state)
+		print(f"{len(checked)}/{king_count} partial checkmate; {state.turn} loses a turn.")
+		state.turn = ["White", "Black"][state.turn == "White"]
+		_show_board(state)
+		print(f"{state.turn} to move.")
 	else:
-		# no possible moves; differentiate between checkmate, stalemate, and partial checkmate
+		# the player to move is the one checkmated
+		winner = ["White", "Black"][state.turn == "White"]
+		print(f"{winner} wins by checkmate!!!")
+		_show_board(state)
+		print(f"{winner} wins by checkmate!!!")
+		state.in_play = False
 
-		king_count = check_count = 0
-		for king, check in _checks():
-			if king.color == turn:
 
-				king_count += 1
+def _take_back(state):
+	"""take back the last move played (see `GameState.history`)"""
+
+	code, undo_entry, previous_turn, turn, in_play = state.history.pop()
+
+	_unmake_move(undo_entry, state)
+	state.turn = previous_turn
+	state.in_play = True
+	state.turn_count -= 1
+	state.undone.append((code, turn, in_play))
+
+
+def _replay(state):
+	"""play again the last move taken back"""
+
+	code, turn, in_play = state.undone.pop()
+	previous_turn = state.turn
+
+	piece, *move = _decode_move(code, state)
+	undo_entry = piece._make_move(*move, state=state)
+	state.turn = turn
+	state.in_play = in_play
+	state.turn_count += 1
+	state.history.append((code, undo_entry, previous_turn, turn, in_play))
+
+
+def _show_turn(state):
+
+	_show_board(state)
+	print(f"{state.turn} to move." if state.in_play else "The game is over.")
+
+
+def undo(state="current"):
+	"""Take back the last move."""
+
+	if state == "current":
+		state = globals()["state"]
+
+	if state is None or not state.history:
+		raise RuntimeError("There's no move to undo!")
+
+	_take_back(state)
+	_show_turn(state)
 
-				if check:
-					check_count += 1
-				
-		if check_count == 0:
-			print("Draw by stalemate!!!")
-			display_board(perspective=turn)
-			print("Draw by stalemate!!!")
-			in_play = False
-		elif check_count < king_count:
-			print(f"{check_count}/{king_count} partial checkmate; {turn} loses a turn.")
-			turn = ["White", "Black"][turn == "White"]
-			display_board(perspective=turn)
-			print(f"{turn} to move.")
-		else:
-			print(f"{turn} wins by checkmate!!!")
-			display_board(perspective=turn)
-			print(f"{turn} wins by checkmate!!!")
-			in_play = False
 
+def redo(state="current"):
+	"""Play again the last move taken back."""
 
-def _checks(pieces="current", board="current"):
+	if state == "current":
+		state = globals()["state"]
+
+	if state is None or not state.undone:
+		raise RuntimeError("There's no move to redo!")
+
+	_replay(state)
+	_show_turn(state)
+
+
+def goto(ply, state="current"):
+	"""Take back or play again moves until the given number of moves has been played."""
+
+	if state == "current":
+		state = globals()["state"]
+
+	ply = int(ply)
+
+	if state is None or not 0 <= ply <= len(state.history) + len(state.undone):
+		raise ValueError("There's no such move!")
+
+	while len(state.history) > ply:
+		_take_back(state)
+
+	while len(state.history) < ply:
+		_replay(state)
+
+	_show_turn(state)
+
+
+def _unmake_move(undo, state="current"):
+	"""restore the position from before the move that produced the given undo entry (see `Piece._make_move`)"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	pieces, board = state.pieces, state.board
+
+	involved, removed, added, attacks_record, key = undo
+
+	for piece in added:
+		if isinstance(piece, Auror):
+			board._shift_auror(piece, piece.file, piece.rank, -1)
+		pieces.remove(piece)
+		board[(piece.file, piece.rank)] = None
+
+	for piece, file, rank, _ in involved:
+		if isinstance(piece, Auror):
+			if piece in pieces:
+				board._shift_auror(piece, piece.file, piece.rank, -1)
+			board._shift_auror(piece, file, rank, 1)
+
+	# clear every square the involved pieces occupy now before putting them back, as their old and new squares may overlap (swaps)
+	for piece, *_ in involved:
+		board[(piece.file, piece.rank)] = None
+
+	for piece, file, rank, moved in involved:
+		piece.file = file
+		piece.rank = rank
+		piece.moved = moved
+		board[(file, rank)] = piece
+
+	pieces.update(removed)
+	board.attacks.restore(attacks_record)
+	board.key = key
+
+
+def _checks(state="current"):
 	"""yields (king, true/false) for each king, indicating whether that king is in check"""
 
-	if pieces == "current":
-		pieces = globals()["pieces"]
+	if state == "current":
+		state = globals()["state"]
 
-	if board == "current":
-		board = globals()["board"]
+	pieces, board = state.pieces, state.board
 
 	for king in pieces:
 		if isinstance(king, King):
+			yield king, board.attacks.attacked(king.file, king.rank, ["White", "Black"][king.color == "White"])
 
-			for piece in pieces:
-				if piece.color != king.color:
 
-					# prevent endless loop for uncastled kings (which must examine checks even before the transition from _normally_possible_moves to possible_moves) in hypothetical scenarios (real scenarios can never have kings checking other kings)
-					if isinstance(piece, King):
-						if abs(ord(piece.file) - ord(king.file)) < 2 and abs(piece.rank - king.rank) < 2:
-							yield king, True
-							break
+def _king_checks(color, state="current"):
+	"""(number of kings of the player, squares of those in check)"""
 
-					else:
+	if state == "current":
+		state = globals()["state"]
 
-						# note that `interacting_pieces` can only be for capture if the moving and interacting pieces are of different players, as there are no cross-player special moves
-						for _, _, interacting_pieces, *_ in piece._normally_possible_moves(pieces=pieces, board=board):
-							if king in interacting_pieces:
-								yield king, True
-								break
-						else:
-							continue
+	king_count = 0
+	checked = set()
 
-						break
+	for king, check in _checks(state):
+		if king.color == color:
+			king_count += 1
+			if check:
+				checked.add((king.file, king.rank))
 
-			else:
-				yield king, False
+	return king_count, checked
 
 
-def _all_possible_moves():
+def _no_moves_result(king_count, check_count):
+	"""what it means that a player with the given numbers of kings and of kings in check has no possible moves"""
 
-	to_skip = []
+	if check_count == 0:
+		return "stalemate"
 
-	for piece in pieces:
-		if piece.color == turn:
-			for file, rank, interacting_pieces, *promote_class in piece.possible_moves():
+	if check_count < king_count:
+		return "partial checkmate"
+
+	return "checkmate"
+
+
+# piece types in the order in which they are tried for a possible move: those with many moves that are seldom made to test
+# them first, and Kings last unless in check
+LIKELY_MOVERS = (Queen, Knight, Rook, Bishop, Pawn, Auror, King)
+
+
+def game_status(state="current"):
+	"""whether the player to move can move ("ongoing"), or else "stalemate", "partial checkmate", or "checkmate"; stops at the
+	first possible move found"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	king_count, checked = _king_checks(state.turn, state)
+
+	def likelihood(piece):
+		if checked and isinstance(piece, King):
+			return -1
+		return LIKELY_MOVERS.index(type(piece))
+
+	for piece in sorted((piece for piece in state.pieces if piece.color == state.turn), key=likelihood):
+		for _ in piece._legal_moves(checked, state):
+			return "ongoing"
+
+	return _no_moves_result(king_count, len(checked))
+
+
+def _all_possible_moves(state="current"):
+
+	if state == "current":
+		state = globals()["state"]
+
+	checked = _king_checks(state.turn, state)[1]
+	to_skip = set()
+
+	# in square order, so that the listing is the same from run to run (and a copy, as testing moves for legality alters the
+	# position in place)
+	for piece in sorted(state.pieces, key=lambda piece: SQUARE_INDEX[(piece.file, piece.rank)]):
+		if piece.color == state.turn:
+			for file, rank, interacting_pieces, *promote_class in piece._legal_moves(checked, state):
+
+				# a King-Auror swap is available to both pieces; list it only once
 				for interacting_piece in interacting_pieces:
-					if interacting_piece.color == piece.color and {piece, interacting_piece} not in to_skip:
-						yield piece, file, rank, interacting_pieces, *promote_class
-						to_skip.append({piece, interacting_piece})
-						break
+					if interacting_piece.color == piece.color:
+						if frozenset({piece, interacting_piece}) in to_skip:
+							break
+						to_skip.add(frozenset({piece, interacting_piece}))
 				else:
 					yield piece, file, rank, interacting_pieces, *promote_class
 
 
-def list_checks():
-	for king, check in _checks():
-		print(f"{repr(king)}: {check}")
+def _move_notation(piece, file, rank, *promote_class):
+	"""the move as the arguments of `move` (e.g. `e7 e8 King`)"""
+
+	notation = f"{piece.file}{piece.rank} {file}{rank}"
+
+	if promote_class and promote_class[0]:
+		notation += f" {promote_class[0].__name__}"
+
+	return notation
+
+
+# Moves packed into integers, from the lowest bits: origin and destination square indices (see `SQUARES`), the kind of move,
+# the square indices of up to two interacting pieces (or `NO_SQUARE`), and the promote class (index in `PIECE_TYPES` plus one,
+# or 0)
+MOVE_QUIET, MOVE_CAPTURE, MOVE_DOUBLE_CAPTURE, MOVE_CASTLE, MOVE_SWAP = range(5)
+NO_SQUARE = 127
+
+
+def _encode_move(piece, file, rank, interacting_pieces, *promote_class):
+	"""the move (as listed by `_all_possible_moves`) as an integer"""
+
+	interacting_squares = sorted(SQUARE_INDEX[(other.file, other.rank)] for other in interacting_pieces) + [NO_SQUARE, NO_SQUARE]
+	capture_count = sum(other.color != piece.color for other in interacting_pieces)
+
+	if capture_count:
+		kind = MOVE_CAPTURE if capture_count == 1 else MOVE_DOUBLE_CAPTURE
+	elif interacting_pieces:
+		kind = MOVE_CASTLE if any(isinstance(other, Rook) for other in interacting_pieces) else MOVE_SWAP
+	else:
+		kind = MOVE_QUIET
+
+	promote = PIECE_TYPES.index(promote_class[0]) + 1 if promote_class and promote_class[0] else 0
+
+	return SQUARE_INDEX[(piece.file, piece.rank)] | SQUARE_INDEX[(file, rank)] << 7 | kind << 14\
+		| interacting_squares[0] << 17 | interacting_squares[1] << 24 | promote << 31
+
+
+def _move_kind(code):
+	return code >> 14 & 7
+
+
+def _move_promote_class(code):
+	"""promote class of the encoded move, or None"""
+
+	promote = code >> 31
+	return PIECE_TYPES[promote - 1] if promote else None
+
+
+def _decode_move(code, state="current"):
+	"""the encoded move as listed by `_all_possible_moves` (piece, file, rank, interacting_pieces, *promote_class), for the game
+	it was encoded in"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	piece = state.board[SQUARES[code & 127]]
+	interacting_pieces = {state.board[SQUARES[index]] for index in (code >> 17 & 127, code >> 24 & 127) if index != NO_SQUARE}
+	promote_class = (_move_promote_class(code),) if isinstance(piece, Pawn) else ()
+
+	return piece, *SQUARES[code >> 7 & 127], interacting_pieces, *promote_class
+
+
+def _move_code_notation(code):
+	"""the encoded move as the arguments of `move` (see `_move_notation`)"""
+
+	notation = "{}{} {}{}".format(*SQUARES[code & 127], *SQUARES[code >> 7 & 127])
+
+	if _move_promote_class(code):
+		notation += f" {_move_promote_class(code).__name__}"
+
+	return notation
+
+
+def _piece_move_codes(piece, state="current"):
+	"""`piece.possible_moves` as encoded moves, from `move_cache` if it is the piece's turn"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	if piece.color == state.turn:
+		return move_cache.lookup(state)[0][(piece.file, piece.rank)]
+
+	return [_encode_move(piece, *move) for move in piece.possible_moves(state)]
+
+
+def _all_possible_move_codes(state="current"):
+	"""encoded `_all_possible_moves`, from `move_cache`"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	# a King-Auror swap is listed by the piece on the lower square only, as in `_all_possible_moves`
+	return [
+		code for codes in move_cache.lookup(state)[0].values() for code in codes
+		if _move_kind(code) != MOVE_SWAP or code & 127 < code >> 7 & 127]
+
+
+def list_checks(state="current"):
+
+	if state == "current":
+		state = globals()["state"]
+
+	for square, check in move_cache.lookup(state)[1].items():
+		print(f"{repr(state.board[square])}: {check}")
 				
 
-def list_all_possible_moves():
+def list_all_possible_moves(state="current"):
 	"""List all of the current player's possible moves."""
 
-	for piece, file, rank, interacting_pieces, *promote_class in _all_possible_moves():
+	if state == "current":
+		state = globals()["state"]
 
-		print(f"{piece} --> {file}{rank}")
+	for code in _all_possible_move_codes(state):
 
-		for interacting_piece in interacting_pieces:
+		piece, file, rank, interacting_pieces, *_ = _decode_move(code, state)
+		print(f"{piece} --> {file}{rank}")
 
-			if interacting_piece.color == piece.color:
+		if _move_kind(code) == MOVE_CASTLE:
+			print("\t(castle queenside)" if file == "c" else "\t(castle kingside)")
 
-				if isinstance(interacting_piece, Rook):
-					if interacting_piece.file < piece.file:
-						print("\t(castle queenside)")
-					else:
-						print("\t(castle kingside)")
-				else:
-					print(f"\t(swap with {type(interacting_piece).__name__})")
+		elif _move_kind(code) == MOVE_SWAP:
+			for interacting_piece in interacting_pieces:
+				print(f"\t(swap with {type(interacting_piece).__name__})")
 
-			else:
+		else:
+			for interacting_piece in interacting_pieces:
 				print(f"\tcapture {interacting_piece}")
 
-		if promote_class and promote_class[0]:
-			print(f"\tpromote to {promote_class.__name__}")
+		if _move_promote_class(code):
+			print(f"\tpromote to {_move_promote_class(code).__name__}")
 
 
-def list_piece_possible_moves(piece_loc):
+def list_piece_possible_moves(piece_loc, state="current"):
 	"""List all possible moves for the piece at the specified location."""
 
-	piece = board[(piece_loc[0], int(piece_loc[1]))]
+	if state == "current":
+		state = globals()["state"]
+
+	piece = state.board[(piece_loc[0], int(piece_loc[1]))]
 
-	for file, rank, interacting_pieces, *promote_class in pieces.possible_moves():
+	if not piece:
+		raise ValueError("There's no piece there!")
 
+	for code in _piece_move_codes(piece, state):
+
+		_, file, rank, interacting_pieces, *promote_class = _decode_move(code, state)
 		print(file + str(rank))
 
 		list_captures = True
-		for piece in interacting_pieces:
-			if piece.color == piece.color:
-				if isinstance(piece, Rook):
+		for interacting_piece in interacting_pieces:
+			if interacting_piece.color == piece.color:
+				if isinstance(interacting_piece, Rook):
 					print("\t(castle)")
-				elif isinstance(piece, King):
+				elif isinstance(interacting_piece, King):
 					print("\t(swap with King)")
-				elif isinstance(piece, Auror):
+				elif isinstance(interacting_piece, Auror):
 					print("\t(swap with Auror)")
 			elif list_captures:
-				print(f"\t(capture {', '.join((p for p in interacting_pieces if p.color != piece.color))})")
+				print(f"\t(capture {', '.join(str(p) for p in interacting_pieces if p.color != piece.color)})")
 				list_captures = False  # only list once and include all captured pieces on this line
 
 		if promote_class and promote_class[0]:
-			print(f"\t(promote to {promote_class.__name__})")
+			print(f"\t(promote to {promote_class[0].__name__})")
+
+
+BOARD_FRAMES = {}  # (variant, perspective): see `_board_frame`
+
+ANSI_COLORS = {"White": "\x1b[1;97m", "Black": "\x1b[1;91m", "marker": "\x1b[1;92m"}
+ANSI_RESET = "\x1b[0m"
+
+
+def _board_frame(variant, perspective):
+	"""(characters of the board with no pieces, as displayed from the player's side, and for each square the positions of an
+	occupant's symbol, the positions left blank around an occupant, and the starts of the 5-character spans marking a move
+	there), computed once per variant and side"""
 
+	key = variant, perspective
+	if key in BOARD_FRAMES:
+		return BOARD_FRAMES[key]
 
-def display_board(perspective="White"):
+	chars = []
+	squares = {square: ([], [], []) for square in BOARDS[variant]}
 
-	if perspective[0].upper() == "W":
+	def write(text):
+		"""add the text and return the position of its first character"""
+		chars.extend(text)
+		return len(chars) - len(text)
+
+	def x_square(rank):
+		symbols, _, markers = squares[("x", rank)]
+		write(" " * 33 + "// \\\\\n" + " " * 31 + "///   \\\\\\\n")
+		for left, right in (("///", "\\\\\\"), ("\\\\\\", "///")):
+			start = write(" " * 29 + left + "       " + right + "\n") + 32
+			symbols.extend((start + 2, start + 4))
+			markers.append(start + 1)
+		write(" " * 31 + "\\\\\\   ///\n" + " " * 33 + "\\\\ //\n")
+
+	if perspective == "White":
 		rank_order = range(8, 0, -1)
 		file_order = "abcdefgh"
 	else:
@@ -902,155 +1676,264 @@ def display_board(perspective="White"):
 	# top X square
 	if variant == "en":
 		rank = 9 if perspective == "White" else 0
-		occupant = board[("x", rank)]
-		occupant = str(occupant) if occupant else " "
-		print(" " * 34, rank)
-		print(" " * 33 + "// \\\\")
-		print(" " * 31 + "///   \\\\\\")
-		print(" " * 29 + f"///  {occupant} {occupant}  \\\\\\")
-		print(" " * 29 + f"\\\\\\  {occupant} {occupant}  ///")
-		print(" " * 31 + "\\\\\\   ///")
-		print(" " * 33 + "\\\\ //")
-		print(" " * 35 + "x")
+		write(" " * 34 + f" {rank}\n")
+		x_square(rank)
+		write(" " * 35 + "x\n")
 
 	# top line
 	if variant == "en":
-		print("    " + " ".join(["-------"] * 3) + " -----// \\\\----- " + " ".join(["-------"] * 3))
+		write("    " + " ".join(["-------"] * 3) + " -----// \\\\----- " + " ".join(["-------"] * 3) + "\n")
 	else:
-		print("    " + " ".join(["-------"] * 8))
+		write("    " + " ".join(["-------"] * 8) + "\n")
 
-	# standard squares
+	# standard squares, as three rows each
 	for rank in rank_order:
 
-		# 1st of 3 rows
-		print("   |", end="")
-		for file in file_order:
-			if (ord(file) - ord("a")) % 2 == (rank - 1) % 2:
-				print("///" + (" " if board[(file, rank)] else "|") + "\\\\\\|", end="")
-			else:
-				print("       |", end="")
+		dark = {file: (ord(file) - ord("a")) % 2 == (rank - 1) % 2 for file in file_order}
 
-		# 2nd of 3 rows
-		print(f"\n{rank}  |", end="")
+		write("   |")
 		for file in file_order:
-
-			occupant = board[(file, rank)]
-
-			if (ord(file) - ord("a")) % 2 == (rank - 1) % 2:
-				occupant = f"  {occupant}  " if occupant else "|||||"
-				print(f"|{occupant}||", end="")
+			if dark[file]:
+				squares[(file, rank)][1].append(write("///|\\\\\\|") + 3)
 			else:
-				occupant = str(occupant) if occupant else " "
-				print(f"   {occupant}   |", end="")
+				write("       |")
 
-		# 3rd of 3 rows
-		print("\n   |", end="")
+		write(f"\n{rank}  |")
+		for file in file_order:
+			symbols, blanks, markers = squares[(file, rank)]
+			start = write("||||||||" if dark[file] else "       |")
+			symbols.append(start + 3)
+			markers.append(start + 1)
+			if dark[file]:
+				blanks.extend((start + 1, start + 2, start + 4, start + 5))
+
+		write("\n   |")
 		for file in file_order:
-			if (ord(file) - ord("a")) % 2 == (rank - 1) % 2:
-				print("\\\\\\" + (" " if board[(file, rank)] else "|") + "///|", end="")
+			if dark[file]:
+				squares[(file, rank)][1].append(write("\\\\\\|///|") + 3)
 			else:
-				print("       |", end="")
+				write("       |")
 
 		# rank separator
 		if rank != rank_order[-1]:
-			print("\n    " + "+".join(["-------"] * 8))
+			write("\n    " + "+".join(["-------"] * 8) + "\n")
 
 	# bottom line
 	if variant == "en":
-		print("\n    " + " ".join(["-------"] * 3) + " -----\\\\ //----- " + " ".join(["-------"] * 3))
+		write("\n    " + " ".join(["-------"] * 3) + " -----\\\\ //----- " + " ".join(["-------"] * 3) + "\n")
 	else:
-		print("\n    " + " ".join(["-------"] * 8))
+		write("\n    " + " ".join(["-------"] * 8) + "\n")
 
 	# file labels
 	if variant == "en":
-		print("       " + "       ".join(file_order[:4]) + "   x   " + "       ".join(file_order[4:]))
+		write("       " + "       ".join(file_order[:4]) + "   x   " + "       ".join(file_order[4:]) + "\n")
 	else:
-		print("       " + "       ".join(file_order))
+		write("       " + "       ".join(file_order) + "\n")
 
 	# bottom X square
 	if variant == "en":
 		rank = 0 if perspective == "White" else 9
-		occupant = board[("x", rank)]
-		occupant = str(occupant) if occupant else " "
-		print(" " * 33 + "// \\\\")
-		print(" " * 31 + "///   \\\\\\")
-		print(" " * 29 + f"///  {occupant} {occupant}  \\\\\\")
-		print(" " * 29 + f"\\\\\\  {occupant} {occupant}  ///")
-		print(" " * 31 + "\\\\\\   ///")
-		print(" " * 33 + "\\\\ //")
-		print(" " * 34, rank)
-
-
-def display_piece_possible_moves(piece_loc, perspective="White"):
-	"""Annotate the board with all possible moves for the piece at the specified location."""
+		x_square(rank)
+		write(" " * 34 + f" {rank}\n")
 
-	from io import StringIO
-	import sys
+	del chars[-1]  # the final line break is left to the output
 
-	orig_stdout = sys.stdout
-	sys.stdout = markup = StringIO()
-	display_board(perspective)
-	markup = markup.getvalue()
-	sys.stdout = orig_stdout
+	frame = BOARD_FRAMES[key] = chars, squares
+	return frame
 
-	piece = board[(piece_loc[0], int(piece_loc[1]))]
 
-	if not piece:
-		raise ValueError("There's no piece there!")
+def _board_characters(perspective, state, markers=None, style="plain"):
+	"""characters of `render_board`, one element per character of the frame (with its escape codes in style "ansi")"""
 
-	for file, rank, interacting_pieces, *promote_class in piece.possible_moves():
+	if style not in {"plain", "ansi"}:
+		raise ValueError(f"unknown style {style!r}")
 
-		if file == "x":
+	chars, squares = _board_frame(state.variant, "White" if perspective[0].upper() == "W" else "Black")
+	buffer = chars.copy()
 
-			chars = " ※ ※ "
+	for piece in state.pieces:
 
-			for interacting_piece in interacting_pieces:
-				if interacting_piece.color == piece.color:
-					if type(interacting_piece) in {King, Auror}:
-						chars = f" ({str(interacting_piece)} {str(interacting_piece)}) "
-				else:
-					chars = f" x{str(interacting_piece)} {str(interacting_piece)}x "
+		symbols, blanks, _ = squares[(piece.file, piece.rank)]
+		symbol = str(piece) if style == "plain" else ANSI_COLORS[piece.color] + str(piece) + ANSI_RESET
 
-			if rank == 9 and perspective[0].upper() == "W" or rank == 0 and perspective[0].upper() == "B":
-				markup = markup[:150] + chars + markup[155:193] + chars + markup[198:]
-			else:
-				markup = markup[:2766] + chars + markup[2771:2809] + chars + markup[2814:]
+		for position in blanks:
+			buffer[position] = " "
+		for position in symbols:
+			buffer[position] = symbol
 
-		else:
+	for square, marker in (markers or {}).items():
+		for start in squares[square][2]:
+			buffer[start:start + 5] = marker
+			if style == "ansi":
+				buffer[start] = ANSI_COLORS["marker"] + buffer[start]
+				buffer[start + 4] += ANSI_RESET
 
-			chars = "  ፠  "
+	return buffer
+
+
+def render_board(perspective="White", state="current", markers=None, style="plain"):
+	"""the board as displayed from the player's side, with each square of `markers` showing its 5-character marker in the
+	middle; style "ansi" colors the pieces and markers with terminal escape codes"""
+
+	if state == "current":
+		state = globals()["state"]
+
+	return "".join(_board_characters(perspective, state, markers, style))
+
+
+def display_board(perspective="White", state="current", style="plain"):
+	print(render_board(perspective, state, style=style))
 
-			for interacting_piece in interacting_pieces:
-				if interacting_piece.color == piece.color:
-					if type(interacting_piece) in {King, Auror}:
-						chars = f" ({str(interacting_piece)}) "
-				else:
-					chars = f" x{str(interacting_piece)}x "
 
-			start = 462
-			file_adjustment = 8 * (ord(file) - ord("a"))
-			rank_adjustment = 275 * (8 - rank if perspective[0].upper() == "W" else rank - 1)
-			chars_loc = start + rank_adjustment + file_adjustment
-			markup = markup[:chars_loc] + chars + markup[chars_loc + 5:]
+def display_piece_possible_moves(piece_loc, perspective="White", state="current", style="plain"):
+	"""Annotate the board with all possible moves for the piece at the specified location."""
+
+	if state == "current":
+		state = globals()["state"]
+
+	piece = state.board[(piece_loc[0], int(piece_loc[1]))]
+
+	if not piece:
+		raise ValueError("There's no piece there!")
 
-	print(markup)
+	markers = {}
 
+	for code in _piece_move_codes(piece, state):
 
-def display_possible_moves_by_piece(perspective="White"):
+		_, file, rank, interacting_pieces, *promote_class = _decode_move(code, state)
+		marker = " ※ ※ " if file == "x" else "  ፠  "
+
+		for interacting_piece in interacting_pieces:
+			symbol = str(interacting_piece)
+			if interacting_piece.color == piece.color:
+				if type(interacting_piece) in {King, Auror}:
+					marker = f"({symbol} {symbol})" if file == "x" else f" ({symbol}) "
+			else:
+				marker = f"x{symbol} {symbol}x" if file == "x" else f" x{symbol}x "
+
+		markers[(file, rank)] = marker
+
+	_show_board(state, markers, perspective, style)
+
+
+def display_possible_moves_by_piece(perspective="White", state="current", style="plain"):
 	"""For each of the current player's pieces, display the board, annoted with all possible moves of that piece."""
 
-	for piece in pieces:
+	if state == "current":
+		state = globals()["state"]
+
+	for piece in list(state.pieces):
 		print(repr(piece))
-		display_piece_possible_moves(piece.file + str(piece.rank))
-		list_piece_possible_moves(piece.file + str(piece.rank))
+		display_piece_possible_moves(piece.file + str(piece.rank), perspective, state, style)
+		list_piece_possible_moves(piece.file + str(piece.rank), state=state)
 		print()
 
+class LiveDisplay:
+	"""The board kept at the top of a terminal from one side, repainted with ANSI cursor movements only where a square's
+	occupant or marker changed; everything printed meanwhile scrolls below it. The whole board is drawn again when the variant
+	or the side changes, and every time if the terminal is too short to keep it in place."""
+
+	def __init__(self, perspective="White", output=None):
+		self.perspective = perspective
+		self.output = output  # sys.stdout by default
+		self.shown = None  # (variant, perspective, characters) of the board on screen
+		self.runs = None  # (start, end) of each stretch of characters that can change, and its line and column on screen
+
+	def draw(self, state, markers=None):
+
+		output = self.output or sys.stdout
+		variant, perspective = state.variant, self.perspective
+		buffer = _board_characters(perspective, state, markers, "ansi")
+
+		if self.shown and self.shown[:2] == (variant, perspective):
+			previous = self.shown[2]
+			updates = [
+				f"\x1b[{line};{column}H" + "".join(buffer[start:end])
+				for start, end, line, column in self.runs if buffer[start:end] != previous[start:end]]
+			output.write("\x1b7" + "".join(updates) + "\x1b8")  # back to where the cursor was
+
+		else:
+			chars, squares = _board_frame(variant, perspective)
+			lines = chars.count("\n") + 1
+			output.write("\x1b[r\x1b[H\x1b[2J" + "".join(buffer) + "\n")
+
+			if lines + 1 < shutil.get_terminal_size().lines:
+				# only the lines below the board scroll
+				output.write(f"\x1b[{lines + 1};{shutil.get_terminal_size().lines}r\x1b[{lines + 1};1H")
+				self.runs = self._runs(chars, squares)
+			else:
+				buffer = None
+
+		self.shown = None if buffer is None else (variant, perspective, buffer)
+		output.flush()
+
+	def _runs(self, chars, squares):
+		"""(start, end, line, column) of the marker spans and the blanked characters outside them, of every square"""
+
+		line_starts = [0] + [position + 1 for position, char in enumerate(chars) if char == "\n"]
+		runs = []
+
+		for symbols, blanks, markers in squares.values():
+			runs.extend((start, start + 5) for start in markers)
+			runs.extend((position, position + 1) for position in blanks if not any(start <= position < start + 5 for start in markers))
+
+		return [
+			(start, end, line, start - line_starts[line - 1] + 1)
+			for start, end in runs for line in [bisect.bisect(line_starts, start)]]
+
+	def close(self):
+		"""let the whole screen scroll again"""
+
+		output = self.output or sys.stdout
+		output.write("\x1b[r\x1b[999;1H\n")
+		output.flush()
+
+
+live_display = None  # the display of the game played through the commands while live (see `live`)
+
+
+def live(perspective="White"):
+	"""Keep the board on screen from the given side, repainting only the squares that change (`live off` to print the whole
+	board after each move again)."""
+
+	global live_display
+
+	if perspective.lower() == "off":
+		if live_display:
+			live_display.close()
+		live_display = None
+		return
+
+	if not live_display:
+		live_display = LiveDisplay()
+	live_display.perspective = "White" if perspective[0].upper() == "W" else "Black"
+
+	if state is not None:
+		_show_board(state)
+
+
+def _show_board(state, markers=None, perspective=None, style="plain"):
+	"""display the board of the game: through the live display if the game is the one played through the commands, otherwise
+	printed whole from the given side (by default the player to move)"""
+
+	if live_display and state is globals()["state"]:
+		live_display.draw(state, markers)
+	else:
+		print(render_board(perspective or state.turn, state, markers, style))
+
 
 
 
 
 
 if __name__ == "__main__":
+
+	# headless line protocol for other programs (see `protocol.py`)
+	if sys.argv[1:] == ["--protocol"]:
+		import protocol
+		protocol.main()
+		sys.exit()
+
 	while True:
 
 		variant = "x"
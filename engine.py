@@ -0,0 +1,449 @@
+"""
+Best-move search for a game (see `enchess.GameState`): negamax alpha-beta with iterative deepening, a transposition
+table, and a time or node budget.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+import enchess
+import evaluation
+from enchess import SQUARE_INDEX
+from evaluation import PIECE_VALUES
+
+
+MATE = 1000000  # score of delivering checkmate now; mates further away score one less per move
+MATE_BOUND = MATE - 1000  # scores beyond this are mates
+
+QUIESCENCE_DEPTH = 4  # captures followed beyond the nominal depth
+DEFAULT_DEPTH = 4  # when no depth, time, or node limit is given
+
+# transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class _OutOfBudget(Exception):
+	"""raised inside the search when the time or node budget runs out"""
+
+
+def _pass_turn(state):
+	state.turn = ["White", "Black"][state.turn == "White"]
+
+
+def _move_key(move):
+	"""integer identifying a move across searches, as its pieces may be new objects after promotions (see `enchess._encode_move`)"""
+	return enchess._encode_move(*move)
+
+
+def no_moves_result(state):
+	"""what it means that the player to move has no possible moves: "stalemate", "partial checkmate", or "checkmate\""""
+
+	king_count, checked = enchess._king_checks(state.turn, state)
+	return enchess._no_moves_result(king_count, len(checked))
+
+
+def _ordered(moves, best_key=None):
+	"""moves with the remembered best move first, then captures of the most valuable pieces by the least valuable ones, then
+	promotions"""
+
+	def priority(move):
+
+		piece, file, rank, interacting_pieces, *promote_class = move
+
+		# ties are broken by squares and promote class, so that the order is the same from run to run
+		tiebreak = SQUARE_INDEX[(piece.file, piece.rank)], SQUARE_INDEX[(file, rank)],\
+			promote_class[0].__name__ if promote_class and promote_class[0] else ""
+
+		if best_key is not None and _move_key(move) == best_key:
+			return -MATE, tiebreak
+
+		gain = sum(PIECE_VALUES[type(captured)] for captured in interacting_pieces if captured.color != piece.color)
+		if gain:
+			gain = 10 * gain - PIECE_VALUES[type(piece)] // 10
+
+		if promote_class and promote_class[0]:
+			gain += PIECE_VALUES[promote_class[0]]
+
+		return -gain, tiebreak
+
+	return sorted(moves, key=priority)
+
+
+def _to_table(score, ply):
+	"""mate scores are stored relative to the position rather than the root"""
+
+	if score > MATE_BOUND:
+		return score + ply
+	if score < -MATE_BOUND:
+		return score - ply
+	return score
+
+
+def _from_table(score, ply):
+
+	if score > MATE_BOUND:
+		return score - ply
+	if score < -MATE_BOUND:
+		return score + ply
+	return score
+
+
+class Search:
+	"""one search of the game within an optional time (seconds) and node budget, reusing the given transposition table if any"""
+
+	def __init__(self, time_limit=None, node_limit=None, table=None, state="current"):
+		self.state = enchess.state if state == "current" else state
+		self.time_limit = time_limit
+		self.node_limit = node_limit
+		self.table = table if table is not None else enchess.TranspositionTable()
+		self.evaluation = evaluation.Evaluation(self.state)  # kept up to date by `_child`
+		self.nodes = 0
+		self.shared_nodes = None  # node count of all the searches sharing the node budget (a `multiprocessing.Value`), if any
+		self.deadline = None
+
+	def run(self, max_depth=None):
+		"""Deepen the search one move at a time until `max_depth` or the budget is reached, and return the results of the deepest
+		completed depth as a dictionary: the best move (as in `enchess._all_possible_moves`) and its notation, the score from the
+		point of view of the player to move, the depth, the principal variation (notations, with None for a lost turn), and the
+		node count and seconds spent. If there are no possible moves, "result" tells why."""
+
+		start = time.perf_counter()
+		self.deadline = None if self.time_limit is None else start + self.time_limit
+		self.nodes = 0
+		self.table.new_generation()
+
+		if max_depth is None and self.time_limit is None and self.node_limit is None:
+			max_depth = DEFAULT_DEPTH
+
+		results = {"move": None, "notation": None, "score": 0, "depth": 0, "pv": [], "nodes": 0, "seconds": 0.0, "result": None}
+		moves = list(enchess._all_possible_moves(self.state))
+
+		if not moves:
+			results["result"] = no_moves_result(self.state)
+
+		else:
+
+			# a move is always available, even if the budget runs out before the first depth is complete
+			results["move"] = _ordered(moves)[0]
+			results["notation"] = results["pv"] = None
+
+			depth = 0
+			while max_depth is None or depth < max_depth:
+				depth += 1
+
+				try:
+					score, pv, move = self._root(moves, depth)
+				except _OutOfBudget:
+					break
+
+				results.update(move=move, score=score, depth=depth, pv=pv)
+
+				if abs(score) > MATE_BOUND:  # nothing to gain by looking deeper
+					break
+
+			results["notation"] = enchess._move_notation(*results["move"][:3], *results["move"][4:])
+			if not results["pv"]:
+				results["pv"] = [results["notation"]]
+
+		results["nodes"] = self.nodes
+		results["seconds"] = time.perf_counter() - start
+		return results
+
+	def _count_node(self):
+
+		if self.shared_nodes is not None:
+			with self.shared_nodes.get_lock():
+				if self.shared_nodes.value >= self.node_limit:
+					raise _OutOfBudget()
+				self.shared_nodes.value += 1
+
+		elif self.node_limit is not None and self.nodes >= self.node_limit:
+			raise _OutOfBudget()
+
+		self.nodes += 1
+
+		if self.deadline is not None and time.perf_counter() > self.deadline:
+			raise _OutOfBudget()
+
+	def _child(self, move, search, *args):
+		"""result of the given search method for the position after the move (restoring the position however the search ends)"""
+
+		piece, file, rank, interacting_pieces, *promote_class = move
+		undo = piece._make_move(file, rank, interacting_pieces, *promote_class, state=self.state)
+		record = self.evaluation.update(undo)
+		_pass_turn(self.state)
+
+		try:
+			return search(*args)
+		finally:
+			_pass_turn(self.state)
+			self.evaluation.restore(record)
+			enchess._unmake_move(undo, self.state)
+
+	def _root(self, moves, depth):
+
+		alpha, beta = -MATE - 1, MATE + 1
+		key = enchess._position_key(self.state)
+		entry = self.table.probe(key)
+		best_move = best_pv = None
+
+		for move in _ordered(moves, entry and entry[3]):
+
+			score, pv = self._root_move(move, depth, alpha, beta)
+
+			if score > alpha:
+				alpha = score
+				best_move = move
+				best_pv = pv
+
+		self.table.store(key, (depth, EXACT, _to_table(alpha, 0), _move_key(best_move)), depth)
+		return alpha, best_pv, best_move
+
+	def _root_move(self, move, depth, alpha, beta=MATE + 1):
+		"""(score, principal variation) of the given move of the player to move, exact if the score is between alpha and beta"""
+
+		notation = enchess._move_notation(*move[:3], *move[4:])
+		score, pv = self._child(move, self._negamax, depth - 1, -beta, -alpha, 1)
+		return -score, [notation] + pv
+
+	def _negamax(self, depth, alpha, beta, ply):
+		"""(score, principal variation) of the current game from the point of view of the player to move"""
+
+		self._count_node()
+
+		if depth <= 0:
+			return self._quiescence(alpha, beta, ply, QUIESCENCE_DEPTH), []
+
+		key = enchess._position_key(self.state)
+		entry = self.table.probe(key)
+
+		if entry is not None and entry[0] >= depth:
+			score = _from_table(entry[2], ply)
+			if entry[1] == EXACT or entry[1] == LOWER and score >= beta or entry[1] == UPPER and score <= alpha:
+				return score, []
+
+		moves = list(enchess._all_possible_moves(self.state))
+
+		if not moves:
+			result = no_moves_result(self.state)
+
+			if result == "stalemate":
+				return 0, []
+
+			if result == "checkmate":
+				return -MATE + ply, []
+
+			# partial checkmate: the player loses a turn
+			_pass_turn(self.state)
+			try:
+				score, pv = self._negamax(depth - 1, -beta, -alpha, ply + 1)
+			finally:
+				_pass_turn(self.state)
+			return -score, [None] + pv
+
+		original_alpha = alpha
+		best_score = -MATE - 1
+		best_move = best_pv = None
+
+		for move in _ordered(moves, entry and entry[3]):
+
+			notation = enchess._move_notation(*move[:3], *move[4:])
+			score, pv = self._child(move, self._negamax, depth - 1, -beta, -alpha, ply + 1)
+			score = -score
+
+			if score > best_score:
+				best_score = score
+				best_move = move
+				best_pv = [notation] + pv
+
+				if score > alpha:
+					alpha = score
+					if alpha >= beta:
+						break
+
+		bound = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+		self.table.store(key, (depth, bound, _to_table(best_score, ply), _move_key(best_move)), depth)
+
+		return best_score, best_pv
+
+	def _quiescence(self, alpha, beta, ply, depth):
+		"""score after following captures only, where the player to move may also stand on the current score"""
+
+		standing = self.evaluation.score()
+
+		if standing >= beta or depth == 0:
+			return standing
+
+		alpha = max(alpha, standing)
+		captures = [move for move in enchess._all_possible_moves(self.state) if any(piece.color != move[0].color for piece in move[3])]
+
+		for move in _ordered(captures):
+
+			self._count_node()
+			score = -self._child(move, self._quiescence, -beta, -alpha, ply + 1, depth - 1)
+
+			if score >= beta:
+				return score
+
+			alpha = max(alpha, score)
+
+		return alpha
+
+
+def search(max_depth=None, time_limit=None, node_limit=None, table=None, state="current"):
+	"""best move of the game with the search results (see `Search.run`)"""
+
+	return Search(time_limit, node_limit, table, state).run(max_depth)
+
+
+# Parallel search: at each depth the moves of the player to move are split between worker processes, which receive the
+# position in the compact form of `enchess._compact_position` and keep a game and a transposition table of their own for it.
+# Under a node budget, all of them count their nodes in one shared counter. Each run starts them with an empty table, so
+# that its results do not depend on earlier runs.
+_worker_run = None
+_worker_position = None
+_worker_state = None
+_worker_table = None
+_worker_nodes = None
+
+
+def _init_worker(shared_nodes):
+
+	global _worker_nodes
+	_worker_nodes = shared_nodes
+
+
+def _search_root_move(run, position, move_key, depth, alpha, deadline, node_limit):
+	"""(score, principal variation, node count) of the move from the compact position, as searched in a worker process against
+	the given alpha (see `Search._root_move`) until the nodes counted by all workers reach the limit; the score and principal
+	variation are None if the budget ran out"""
+
+	global _worker_run, _worker_position, _worker_state, _worker_table
+
+	# searches leave the position as they found it, so it only needs setting up when a new run (of the given number) comes in
+	if (run, position) != (_worker_run, _worker_position):
+		_worker_run, _worker_position = run, position
+		_worker_state = enchess._expand_position(position)
+		_worker_table = enchess.TranspositionTable()
+
+	move = enchess._decode_move(move_key, _worker_state)
+	search = Search(node_limit=node_limit, table=_worker_table, state=_worker_state)
+	if node_limit is not None:
+		search.shared_nodes = _worker_nodes
+	if deadline is not None:
+		search.deadline = time.perf_counter() + deadline - time.time()
+
+	try:
+		score, pv = search._root_move(move, depth, alpha)
+	except _OutOfBudget:
+		return None, None, search.nodes
+
+	return score, pv, search.nodes
+
+
+class ParallelSearch:
+	"""Searches of games split between worker processes (one per core by default), which stay up between searches
+	until `close`. With one worker, searches under a depth or node budget give the same results every time."""
+
+	def __init__(self, workers=None):
+		self.workers = workers or os.cpu_count() or 1
+		context = multiprocessing.get_context()
+		self.nodes = context.Value("q", 0)  # nodes searched by all workers in the current search
+		self.runs = 0
+		self.executor = concurrent.futures.ProcessPoolExecutor(
+			self.workers, context, initializer=_init_worker, initargs=(self.nodes,))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def close(self):
+		self.executor.shutdown(cancel_futures=True)
+
+	def run(self, max_depth=None, time_limit=None, node_limit=None, state="current"):
+		"""Like `Search.run`, with the node budget shared by all workers: they count their nodes together and stop as soon as
+		the total reaches it. At each depth the best move so far is searched first,
+		then the others at once against its score, and the best of them is kept in move order."""
+
+		if state == "current":
+			state = enchess.state
+
+		start = time.perf_counter()
+		deadline = None if time_limit is None else time.time() + time_limit
+
+		if max_depth is None and time_limit is None and node_limit is None:
+			max_depth = DEFAULT_DEPTH
+
+		results = {"move": None, "notation": None, "score": 0, "depth": 0, "pv": [], "nodes": 0, "seconds": 0.0, "result": None}
+		moves = _ordered(list(enchess._all_possible_moves(state)))
+		nodes = 0
+		self.nodes.value = 0
+		self.runs += 1
+
+		if not moves:
+			results["result"] = no_moves_result(state)
+
+		else:
+
+			position = enchess._compact_position(state)
+			keys = [_move_key(move) for move in moves]
+			results["move"] = moves[0]
+			results["pv"] = None
+
+			depth = 0
+			while (max_depth is None or depth < max_depth) and (node_limit is None or nodes < node_limit):
+				depth += 1
+
+				score, pv, task_nodes = self.executor.submit(
+					_search_root_move, self.runs, position, keys[0], depth, -MATE - 1, deadline, node_limit).result()
+				nodes += task_nodes
+				if pv is None:
+					break
+
+				best_index = 0
+				futures = [
+					self.executor.submit(_search_root_move, self.runs, position, key, depth, score, deadline, node_limit) for key in keys[1:]]
+
+				for index, future in enumerate(futures, 1):
+					move_score, move_pv, task_nodes = future.result()
+					nodes += task_nodes
+
+					if move_pv is None:
+						# the budget is out for the moves still being searched too: count the nodes they reached
+						for remaining_future in futures[index:]:
+							if not remaining_future.cancel():
+								nodes += remaining_future.result()[2]
+						break
+
+					if move_score > score:
+						score, pv, best_index = move_score, move_pv, index
+
+				else:
+					results.update(move=moves[best_index], score=score, depth=depth, pv=pv)
+					keys.insert(0, keys.pop(best_index))
+					moves.insert(0, moves.pop(best_index))
+
+					if abs(score) <= MATE_BOUND:
+						continue
+
+				break
+
+			results["notation"] = enchess._move_notation(*results["move"][:3], *results["move"][4:])
+			if not results["pv"]:
+				results["pv"] = [results["notation"]]
+
+		results["nodes"] = nodes
+		results["seconds"] = time.perf_counter() - start
+		return results
+
+
+def parallel_search(max_depth=None, time_limit=None, node_limit=None, workers=None, state="current"):
+	"""best move of the game with the search results, searched by the given number of worker processes (see
+	`ParallelSearch.run`)"""
+
+	with ParallelSearch(workers) as parallel:
+		return parallel.run(max_depth, time_limit, node_limit, state)
@@ -0,0 +1,249 @@
+"""
+Static evaluation of a game (see `enchess.GameState`), as the sum of a few terms for each player: material, piece placement
+(tables over all 66 squares), mobility of the long-range pieces, their Penetration or Stunted mode, and the safety of each King.
+
+An `Evaluation` keeps the terms up to date as moves are made and unmade, looking only at the pieces each move touched, and
+gives them term by term (`breakdown`) for tuning. Run `python3 evaluation.py [NOTATION]` to see the breakdown of a position.
+"""
+
+import enchess
+from enchess import KING_SQUARES, LongRangePiece, Pawn, Rook, Knight, Bishop, Queen, King, Auror
+
+
+PIECE_VALUES = {
+	Pawn: 100, Knight: 320, Bishop: 330, Rook: 500, Queen: 900,
+	Auror: 300,  # cannot capture, but gives Penetration mode and is a King's escape through swaps
+	King: 2000  # each extra King makes full checkmate harder, and a King can be captured after partial checkmate
+}
+
+# per square a long-range piece could capture on (the squares of the other pieces depend on their own square alone, so are
+# left to the placement tables)
+MOBILITY = {Pawn: 0, Knight: 0, Bishop: 4, Rook: 2, Queen: 1, King: 0, Auror: 0}
+
+PENETRATION_BONUS = 30  # a long-range piece next to more of its own Aurors than enemy ones, which may capture twice
+STUNTED_PENALTY = -50  # a long-range piece next to more enemy Aurors than its own, which moves one square only
+KING_ATTACK_PENALTY = 15  # per enemy attack on a King's square or the squares around it
+
+TERMS = ("material", "placement", "mobility", "mode", "king safety")
+
+
+def _placement_table(rows, x0=0, x9=0):
+	"""{square: value} for White from the rows of a table written from rank 8 down to rank 1, and the values of the x squares"""
+
+	table = {(file, 8 - row): value for row, values in enumerate(rows) for file, value in zip("abcdefgh", values)}
+	table.update({("x", 0): x0, ("x", 9): x9})
+
+	return table
+
+
+_WHITE_PLACEMENT = {
+	Pawn: _placement_table((
+		(60, 60, 60, 60, 60, 60, 60, 60),  # EN only: waiting to promote
+		(50, 50, 50, 50, 50, 50, 50, 50),
+		(10, 10, 20, 30, 30, 20, 10, 10),
+		(5, 5, 10, 25, 25, 10, 5, 5),
+		(0, 0, 0, 20, 20, 0, 0, 0),
+		(5, -5, -10, 0, 0, -10, -5, 5),
+		(5, 10, 10, -20, -20, 10, 10, 5),
+		(0, 0, 0, 0, 0, 0, 0, 0))),
+	Knight: _placement_table((
+		(-50, -40, -30, -30, -30, -30, -40, -50),
+		(-40, -20, 0, 0, 0, 0, -20, -40),
+		(-30, 0, 10, 15, 15, 10, 0, -30),
+		(-30, 5, 15, 20, 20, 15, 5, -30),
+		(-30, 0, 15, 20, 20, 15, 0, -30),
+		(-30, 5, 10, 15, 15, 10, 5, -30),
+		(-40, -20, 0, 5, 5, 0, -20, -40),
+		(-50, -40, -30, -30, -30, -30, -40, -50)), -30, -30),
+	Bishop: _placement_table((
+		(-20, -10, -10, -10, -10, -10, -10, -20),
+		(-10, 0, 0, 0, 0, 0, 0, -10),
+		(-10, 0, 5, 10, 10, 5, 0, -10),
+		(-10, 5, 5, 10, 10, 5, 5, -10),
+		(-10, 0, 10, 10, 10, 10, 0, -10),
+		(-10, 10, 10, 10, 10, 10, 10, -10),
+		(-10, 5, 0, 0, 0, 0, 5, -10),
+		(-20, -10, -10, -10, -10, -10, -10, -20)), -10, 0),
+	Rook: _placement_table((
+		(0, 0, 0, 0, 0, 0, 0, 0),
+		(5, 10, 10, 10, 10, 10, 10, 5),
+		(-5, 0, 0, 0, 0, 0, 0, -5),
+		(-5, 0, 0, 0, 0, 0, 0, -5),
+		(-5, 0, 0, 0, 0, 0, 0, -5),
+		(-5, 0, 0, 0, 0, 0, 0, -5),
+		(-5, 0, 0, 0, 0, 0, 0, -5),
+		(0, 0, 0, 5, 5, 0, 0, 0)), -20, -20),  # no files or ranks run through the x squares
+	Queen: _placement_table((
+		(-20, -10, -10, -5, -5, -10, -10, -20),
+		(-10, 0, 0, 0, 0, 0, 0, -10),
+		(-10, 0, 5, 5, 5, 5, 0, -10),
+		(-5, 0, 5, 5, 5, 5, 0, -5),
+		(0, 0, 5, 5, 5, 5, 0, -5),
+		(-10, 5, 5, 5, 5, 5, 0, -10),
+		(-10, 0, 5, 0, 0, 0, 0, -10),
+		(-20, -10, -10, -5, -5, -10, -10, -20)), -10, -10),
+	King: _placement_table((
+		(-30, -40, -40, -50, -50, -40, -40, -30),
+		(-30, -40, -40, -50, -50, -40, -40, -30),
+		(-30, -40, -40, -50, -50, -40, -40, -30),
+		(-30, -40, -40, -50, -50, -40, -40, -30),
+		(-20, -30, -30, -40, -40, -30, -30, -20),
+		(-10, -20, -20, -20, -20, -20, -20, -10),
+		(20, 20, 0, 0, 0, 0, 20, 20),
+		(20, 30, 10, 0, 0, 10, 30, 20)), 10, -50),  # behind its own back rank, or deep in enemy lines
+	Auror: _placement_table((
+		(-20, -10, -10, -10, -10, -10, -10, -20),
+		(-10, 0, 5, 5, 5, 5, 0, -10),
+		(-10, 5, 10, 10, 10, 10, 5, -10),
+		(-10, 5, 10, 15, 15, 10, 5, -10),
+		(-10, 5, 10, 15, 15, 10, 5, -10),
+		(-10, 5, 10, 10, 10, 10, 5, -10),
+		(-10, 0, 5, 5, 5, 5, 0, -10),
+		(-20, -10, -10, -10, -10, -10, -10, -20)), 0, 10),
+}
+
+# piece type: color: square: value, Black's tables being White's seen from the other side (x0 and x9 swap places too)
+PLACEMENT = {
+	piece_type: {"White": table, "Black": {(file, 9 - rank): value for (file, rank), value in table.items()}}
+	for piece_type, table in _WHITE_PLACEMENT.items()}
+
+
+class Evaluation:
+	"""Terms of the static evaluation of a game, for each piece and in total for each player, kept up to date through the undo
+	entries of its moves as the `enchess.AttackMap` is: `update` after `Piece._make_move`, and `restore` with the record it
+	returns when the move is unmade. Only the pieces the move displaced, captured or added, and those whose attacked squares
+	changed, are evaluated again; King safety is read from the attack map's counts when the score is asked for."""
+
+	def __init__(self, state):
+		self.state = state
+		self.pieces = {}  # piece: (material, placement, mobility, mode)
+		self.totals = {"White": [0, 0, 0, 0], "Black": [0, 0, 0, 0]}  # the same terms summed over each player's pieces
+		self.kings = {"White": set(), "Black": set()}
+
+		for piece in state.pieces:
+			self._add(piece, self._piece_terms(piece))
+
+	def update(self, undo):
+		"""Bring the terms up to date after the move of the undo entry (see `Piece._make_move`) and return the record with which
+		`restore` takes it back."""
+
+		involved, removed, added, attacks_record, _ = undo
+		pieces = self.state.pieces
+		record = []
+
+		for piece in {piece for piece, *_ in involved}.union(added, (piece for piece, *_ in attacks_record)):
+			record.append((piece, self.pieces.get(piece)))
+			self._remove(piece)
+			if piece in pieces:
+				self._add(piece, self._piece_terms(piece))
+
+		return record
+
+	def restore(self, record):
+		"""take back an `update`"""
+
+		for piece, terms in record:
+			self._remove(piece)
+			if terms is not None:
+				self._add(piece, terms)
+
+	def score(self):
+		"""sum of the terms from the point of view of the player to move"""
+
+		white, black = self.totals["White"], self.totals["Black"]
+		score = sum(white) - sum(black) + self._king_safety("White") - self._king_safety("Black")
+
+		return score if self.state.turn == "White" else -score
+
+	def breakdown(self):
+		"""{term: White's value minus Black's} for each of `TERMS`"""
+
+		terms = dict(zip(TERMS, (white - black for white, black in zip(self.totals["White"], self.totals["Black"]))))
+		terms["king safety"] = self._king_safety("White") - self._king_safety("Black")
+
+		return terms
+
+	def _piece_terms(self, piece):
+
+		board = self.state.board
+		square = piece.file, piece.rank
+		piece_type = type(piece)
+
+		mode = 0
+		if isinstance(piece, LongRangePiece):
+			own_count = board.aurors[piece.color][square]
+			enemy_count = board.aurors["White" if piece.color == "Black" else "Black"][square]
+			if own_count > enemy_count:
+				mode = PENETRATION_BONUS
+			elif own_count < enemy_count:
+				mode = STUNTED_PENALTY
+
+		return (
+			PIECE_VALUES[piece_type], PLACEMENT[piece_type][piece.color][square],
+			MOBILITY[piece_type] * len(board.attacks.squares.get(piece, ())), mode)
+
+	def _king_safety(self, color):
+
+		enemy_counts = self.state.board.attacks.counts["White" if color == "Black" else "Black"]
+		neighbors = KING_SQUARES[self.state.variant]
+		attacks = 0
+
+		for king in self.kings[color]:
+			square = king.file, king.rank
+			attacks += enemy_counts[square] + sum(enemy_counts[neighbor] for neighbor in neighbors[square])
+
+		return -KING_ATTACK_PENALTY * attacks
+
+	def _add(self, piece, terms):
+
+		self.pieces[piece] = terms
+		totals = self.totals[piece.color]
+		for index, value in enumerate(terms):
+			totals[index] += value
+
+		if isinstance(piece, King):
+			self.kings[piece.color].add(piece)
+
+	def _remove(self, piece):
+
+		terms = self.pieces.pop(piece, None)
+		if terms is None:
+			return
+
+		totals = self.totals[piece.color]
+		for index, value in enumerate(terms):
+			totals[index] -= value
+
+		self.kings[piece.color].discard(piece)
+
+
+def evaluate(state="current"):
+	"""static evaluation of the game from the point of view of the player to move"""
+
+	if state == "current":
+		state = enchess.state
+
+	return Evaluation(state).score()
+
+
+def breakdown(state="current"):
+	"""`Evaluation.breakdown` of the game"""
+
+	if state == "current":
+		state = enchess.state
+
+	return Evaluation(state).breakdown()
+
+
+if __name__ == "__main__":
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Show the static evaluation of a position term by term.")
+	parser.add_argument("notation", nargs="*", help="position in notation (default: the EN start; see enchess.position_notation)")
+	args = parser.parse_args()
+
+	state = enchess.parse_position(" ".join(args.notation)) if args.notation else enchess.GameState("en")
+
+	for term, value in breakdown(state).items():
+		print(f"{term:>12}: {value:+}")
+	print(f"{'total':>12}: {evaluate(state):+} for {state.turn}")
@@ -0,0 +1,308 @@
+"""
+Batch features and evaluation of many positions at once with NumPy, for tuning and dataset work.
+
+Positions (in notation, see `enchess.position_notation`, or compact, see `enchess._compact_position`) are decoded into
+arrays of shape (N, 66, 14): one plane per color and piece type (see `PLANES`) over the squares of `enchess.SQUARES`. From
+those, Auror adjacency counts, attacked squares, and the terms of `evaluation.Evaluation` are computed for the whole batch
+with array operations. `iter_features` streams any number of positions in chunks, so that memory stays bounded.
+
+Needs NumPy. Run `python3 features.py FILE...` to evaluate the positions of files (one notation per line).
+"""
+
+import itertools
+import time
+
+import numpy as np
+
+import evaluation
+from enchess import BOARDS, SQUARES, SQUARE_INDEX, PIECE_TYPES, KING_SQUARES, KNIGHT_SQUARES, RAYS, NOTATION_PIECES, NOTATION_LETTERS, NOTATION_ROWS, LongRangePiece, Pawn, Knight, King, Auror
+
+
+COLORS = ("White", "Black")
+PLANES = [(color, piece_type) for color in COLORS for piece_type in PIECE_TYPES]  # plane index: 7 * color index + type index
+SQUARE_COUNT = len(SQUARES)
+NO_SQUARE = SQUARE_COUNT  # padding of the rays, an extra square that is always empty
+
+LONG_RANGE_TYPES = [piece_type for piece_type in PIECE_TYPES if issubclass(piece_type, LongRangePiece)]
+DIRECTIONS = LONG_RANGE_TYPES[-1].directions  # the Queen's, which include the others'
+
+PIECE_VALUES = np.array([evaluation.PIECE_VALUES[piece_type] for piece_type in PIECE_TYPES])
+MOBILITY = np.array([evaluation.MOBILITY[piece_type] for piece_type in PIECE_TYPES])
+
+# (14, 66): value of each plane's piece on each square
+PLACEMENT = np.array([
+	[evaluation.PLACEMENT[piece_type][color][square] for square in SQUARES] for color, piece_type in PLANES])
+
+
+def _geometry(variant):
+	"""arrays of the variant's board: the squares next to each square, and those and the square itself (as matrices), the
+	squares each player's leaping pieces attack (as one matrix for all of a player's piece types), and the rays of each square
+	in each of `DIRECTIONS` padded with `NO_SQUARE`"""
+
+	squares = BOARDS[variant]
+
+	# float matrices, whose products are exact for these counts and much faster than integer ones
+	neighbors = np.zeros((SQUARE_COUNT, SQUARE_COUNT))
+	for square in squares:
+		for neighbor in KING_SQUARES[variant][square]:
+			neighbors[SQUARE_INDEX[square], SQUARE_INDEX[neighbor]] = 1
+
+	# Pawns, Knights and Kings attack the same squares wherever the other pieces are (Aurors attack none)
+	leaps = np.zeros((len(COLORS), len(PIECE_TYPES) * SQUARE_COUNT, SQUARE_COUNT))  # row: type index * 66 + square index
+	for color_index, (color, forward, last_rank) in enumerate((("White", 1, 8), ("Black", -1, 1))):
+		for square in squares:
+			file, rank = square
+			index = SQUARE_INDEX[square]
+
+			for piece_type, targets in ((Knight, KNIGHT_SQUARES[variant][square]), (King, KING_SQUARES[variant][square])):
+				for target in targets:
+					leaps[color_index, PIECE_TYPES.index(piece_type) * SQUARE_COUNT + index, SQUARE_INDEX[target]] = 1
+
+			# forward diagonals, and in EN the x square from d or e on the last rank (see `Pawn._attacked_squares`)
+			if file == "x":
+				continue
+			targets = [(chr(ord(file) - 1), rank + forward), (chr(ord(file) + 1), rank + forward)]
+			if rank == last_rank and file in {"d", "e"}:
+				targets.append(("x", rank + forward))
+			for target in targets:
+				if target in squares:
+					leaps[color_index, PIECE_TYPES.index(Pawn) * SQUARE_COUNT + index, SQUARE_INDEX[target]] = 1
+
+	length = max(len(ray) for rays in RAYS[variant].values() for ray in rays.values())
+	rays = np.full((SQUARE_COUNT + 1, len(DIRECTIONS), length), NO_SQUARE)
+	for square in squares:
+		for direction_index, direction in enumerate(DIRECTIONS):
+			ray = [SQUARE_INDEX[target] for target in RAYS[variant][square][direction]]
+			rays[SQUARE_INDEX[square], direction_index, :len(ray)] = ray
+
+	return {"neighbors": neighbors, "around": neighbors + np.eye(SQUARE_COUNT), "leaps": leaps, "rays": rays}
+
+
+GEOMETRY = {variant: _geometry(variant) for variant in BOARDS}
+
+# (7, 8): which of `DIRECTIONS` each piece type moves in
+TYPE_DIRECTIONS = np.array([
+	[direction in getattr(piece_type, "directions", ()) for direction in DIRECTIONS] for piece_type in PIECE_TYPES])
+
+# the squares in the order of notation (the EN rows, where the standard board has no x squares), as indices of `SQUARES`
+NOTATION_ORDER = np.array([SQUARE_INDEX[square] for row in NOTATION_ROWS["en"] for square in row])
+_NOTATION_POSITIONS = {square: position for position, square in enumerate(SQUARES[index] for index in NOTATION_ORDER)}
+_ROW_LENGTHS = {variant: [len(row) for row in rows] for variant, rows in NOTATION_ROWS.items()}
+_EXPAND_DIGITS = str.maketrans({str(digit): "." * digit for digit in range(1, 9)})
+
+_BOARD_CHARS = set(NOTATION_PIECES) | {"."}
+
+# plane of each character code of the pieces in notation, -1 for an empty square
+_CHAR_PLANES = np.full(256, -1, np.int8)
+_CHAR_PLANES[[ord(char) for char in NOTATION_PIECES]] = [
+	7 * COLORS.index(color) + type_index for type_index, color in NOTATION_PIECES.values()]
+
+
+def _board_chars(position):
+	"""(variant, White to move, the 66 characters of the board in `NOTATION_ORDER`, "." where empty) of the position"""
+
+	if not isinstance(position, str):
+		variant, turn, pieces = position
+		chars = ["."] * SQUARE_COUNT
+		for type_index, color, file, rank, _ in pieces:
+			chars[_NOTATION_POSITIONS[(file, rank)]] = NOTATION_LETTERS[(PIECE_TYPES[type_index], color)]
+		return variant, turn == "White", "".join(chars)
+
+	try:
+		placement, turn, _ = position.split()
+	except ValueError:
+		raise ValueError(f"Expected 3 fields in {position!r}!") from None
+
+	rows = placement.translate(_EXPAND_DIGITS).split("/")
+	variant = {8: "standard", 10: "en"}.get(len(rows))
+
+	if variant is None or turn not in {"w", "b"} or [len(row) for row in rows] != _ROW_LENGTHS[variant]:
+		raise ValueError(f"Not a position: {position!r}!")
+
+	chars = "".join(rows)
+	return variant, turn == "w", chars if variant == "en" else "." + chars + "."
+
+
+def encode(positions):
+	"""(planes, White to move, variants) of the positions as arrays of shape (N, 66, 14), (N,) and (N,); a plane holds 1 where a
+	piece of its color and type stands"""
+
+	positions = list(positions)
+	decoded = [_board_chars(position) for position in positions]
+
+	all_chars = "".join(chars for _, _, chars in decoded)
+
+	if not set(all_chars) <= _BOARD_CHARS:
+		bad = next(position for position, (_, _, chars) in zip(positions, decoded) if not set(chars) <= _BOARD_CHARS)
+		raise ValueError(f"Not a position: {bad!r}!")
+
+	plane_indices = _CHAR_PLANES[np.frombuffer(all_chars.encode(), np.uint8)].reshape(len(decoded), SQUARE_COUNT)
+	position_indices, notation_positions = np.nonzero(plane_indices >= 0)
+
+	planes = np.zeros((len(decoded), SQUARE_COUNT, len(PLANES)), np.uint8)
+	planes[position_indices, NOTATION_ORDER[notation_positions], plane_indices[position_indices, notation_positions]] = 1
+
+	white_to_move = np.array([white for _, white, _ in decoded], bool)
+	variants = np.array([variant for variant, _, _ in decoded])
+
+	return planes, white_to_move, variants
+
+
+def features(planes, white_to_move, variants):
+	"""Features of the encoded positions (see `encode`), as a dict of arrays whose last axis is (White, Black) where it has two
+	entries:
+
+		auror_adjacency  (N, 66, 2)  Aurors of each player next to each square (see `enchess.Board.aurors`)
+		attacks          (N, 66, 2)  pieces of each player that could capture on each square (see `enchess.AttackMap.counts`)
+		material, placement, mobility, mode, king_safety
+		                 (N, 2)      the terms of `evaluation.Evaluation` for each player
+		breakdown        (N, 5)      White's terms minus Black's, in the order of `evaluation.TERMS`
+		score            (N,)        their sum from the point of view of the player to move (`evaluation.evaluate`)
+	"""
+
+	count = len(planes)
+	encoded, planes = planes, planes.astype(np.float64)
+
+	auror_adjacency = np.zeros((count, SQUARE_COUNT, 2))
+	attacks = np.zeros((count, SQUARE_COUNT, 2))
+	mobility = np.zeros((count, 2))
+	mode = np.zeros((count, 2))
+	king_safety = np.zeros((count, 2))
+
+	for variant, geometry in GEOMETRY.items():
+
+		batch = np.flatnonzero(variants == variant)
+		if not len(batch):
+			continue
+
+		variant_planes = planes[batch]
+
+		for color_index in (0, 1):
+			color_planes = variant_planes[:, :, 7 * color_index:7 * color_index + 7]
+			auror_adjacency[batch, :, color_index] = color_planes[:, :, PIECE_TYPES.index(Auror)] @ geometry["neighbors"]
+
+			# all leaping pieces of the player at once
+			attacks[batch, :, color_index] = color_planes.transpose(0, 2, 1).reshape(len(batch), -1) @ geometry["leaps"][color_index]
+
+		long_range_attacks, mobility[batch], mode[batch] = _long_range(encoded[batch], geometry["rays"], auror_adjacency[batch])
+		attacks[batch] += long_range_attacks
+
+		# enemy attacks on each King's square and the squares next to it
+		for color_index in (0, 1):
+			kings = variant_planes[:, :, 7 * color_index + PIECE_TYPES.index(King)]
+			king_safety[batch, color_index] = -evaluation.KING_ATTACK_PENALTY * (
+				(kings @ geometry["around"]) * attacks[batch, :, 1 - color_index]).sum(axis=1)
+
+	counts = planes.sum(axis=1)  # (N, 14)
+	material = np.stack([counts[:, :7] @ PIECE_VALUES, counts[:, 7:] @ PIECE_VALUES], axis=1)
+	placement_by_plane = np.einsum("nsp,ps->np", planes, PLACEMENT)
+	placement = np.stack([placement_by_plane[:, :7].sum(axis=1), placement_by_plane[:, 7:].sum(axis=1)], axis=1)
+
+	terms = [material, placement, mobility, mode, king_safety]
+	breakdown = np.stack([term[:, 0] - term[:, 1] for term in terms], axis=1)
+	score = breakdown.sum(axis=1) * np.where(white_to_move, 1, -1)
+
+	arrays = {
+		"auror_adjacency": auror_adjacency, "attacks": attacks, "material": material, "placement": placement,
+		"mobility": mobility, "mode": mode, "king_safety": king_safety, "breakdown": breakdown, "score": score}
+
+	return {name: array.astype(np.int64) for name, array in arrays.items()}
+
+
+def _long_range(planes, rays, auror_adjacency):
+	"""(attacks, mobility, mode) of the long-range pieces of encoded positions of one variant, given the variant's rays and the
+	positions' Auror adjacency counts (see `features`)"""
+
+	count = len(planes)
+	attacks = np.zeros(count * (SQUARE_COUNT + 1) * 2)
+	mobility = np.zeros(count * 2)
+	mode = np.zeros(count * 2)
+
+	long_range_planes = [7 * color_index + PIECE_TYPES.index(piece_type) for color_index in (0, 1) for piece_type in LONG_RANGE_TYPES]
+	positions, squares, which = np.nonzero(planes[:, :, long_range_planes])
+
+	if len(positions):
+
+		plane_indices = np.array(long_range_planes)[which]
+		colors = plane_indices // 7
+		type_indices = plane_indices % 7
+
+		# occupancy by each player along the rays of each piece, (pieces, directions, distance), through flat indices of
+		# (position, square, color)
+		occupied = np.zeros((count, SQUARE_COUNT + 1, 2), np.float32)
+		occupied[:, :SQUARE_COUNT, 0] = planes[:, :, :7].sum(axis=2)
+		occupied[:, :SQUARE_COUNT, 1] = planes[:, :, 7:].sum(axis=2)
+		piece_rays = rays[squares]
+		targets = (positions[:, None, None] * (SQUARE_COUNT + 1) + piece_rays) * 2 + colors[:, None, None]
+		own = occupied.reshape(-1)[targets]
+		enemy = occupied.reshape(-1)[targets ^ 1]
+
+		own_count = auror_adjacency[positions, squares, colors]
+		enemy_count = auror_adjacency[positions, squares, 1 - colors]
+		penetration = own_count > enemy_count
+		stunted = own_count < enemy_count
+
+		# a square is attacked until an own piece, or past as many enemy pieces as the piece may capture (two in Penetration
+		# mode); the pieces along the rays are counted by products with triangular matrices
+		length = rays.shape[2]
+		own_so_far = own @ np.triu(np.ones((length, length), np.float32))
+		enemies_before = enemy @ np.triu(np.ones((length, length), np.float32), 1)
+		attacked = (own_so_far == 0) & (enemies_before < 1 + penetration[:, None, None]) & (piece_rays != NO_SQUARE)
+		attacked &= TYPE_DIRECTIONS[type_indices][:, :, None]
+		attacked[stunted, :, 1:] = False
+
+		attacks = np.bincount(targets[attacked], minlength=len(attacks)).astype(np.float64)
+
+		piece_indices = positions * 2 + colors
+		mobility = np.bincount(piece_indices, MOBILITY[type_indices] * attacked.sum(axis=(1, 2)), len(mobility))
+		mode = np.bincount(piece_indices, np.where(
+			penetration, evaluation.PENETRATION_BONUS, np.where(stunted, evaluation.STUNTED_PENALTY, 0)), len(mode))
+
+	return attacks.reshape(count, SQUARE_COUNT + 1, 2)[:, :SQUARE_COUNT], mobility.reshape(count, 2), mode.reshape(count, 2)
+
+
+def iter_features(positions, chunk_size=4096):
+	"""(number of positions, `features`) of each chunk of the positions (any iterable, e.g. the lines of an open file), read
+	only as they are needed"""
+
+	positions = iter(positions)
+
+	for chunk in iter(lambda: list(itertools.islice(positions, chunk_size)), []):
+		yield len(chunk), features(*encode(chunk))
+
+
+def evaluate_all(positions, chunk_size=4096):
+	"""`evaluation.evaluate` of each of the positions, in order"""
+
+	for _, chunk_features in iter_features(positions, chunk_size):
+		yield from chunk_features["score"].tolist()
+
+
+if __name__ == "__main__":
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Evaluate the positions of the files (one notation per line) in batches.")
+	parser.add_argument("paths", nargs="+", metavar="file", help="file of positions in notation")
+	parser.add_argument("--chunk-size", type=int, default=4096, help="positions per batch (default: 4096)")
+	parser.add_argument("--output", help="save the features of each batch to OUTPUT-00000.npz and so on")
+	args = parser.parse_args()
+
+	def all_positions():
+		for path in args.paths:
+			with open(path) as lines:
+				yield from (line.strip() for line in lines if line.strip())
+
+	total = 0
+	breakdown = np.zeros(len(evaluation.TERMS))
+	start = time.perf_counter()
+
+	for chunk_index, (count, chunk_features) in enumerate(iter_features(all_positions(), args.chunk_size)):
+		total += count
+		breakdown += chunk_features["breakdown"].sum(axis=0)
+		if args.output:
+			np.savez(f"{args.output}-{chunk_index:05}.npz", **chunk_features)
+
+	seconds = time.perf_counter() - start
+	print(f"{total} positions in {seconds:.2f} s ({total / seconds:,.0f} positions/s)")
+	for term, value in zip(evaluation.TERMS, breakdown / max(total, 1)):
+		print(f"{term:>12}: {value:+.1f} on average for White")
@@ -0,0 +1,391 @@
+"""
+Move-generation node counts (perft) for the standard and EN variants, with stored test positions and their expected counts.
+
+Run `python3 perft.py` to check every stored position and print throughput; see `python3 perft.py --help` for options.
+"""
+
+import random
+import time
+
+import bitboard
+import enchess
+import engine
+
+
+# positions in notation (see `enchess.position_notation`) with their expected node counts by depth
+POSITIONS = {
+	"standard": {
+		"notation": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w AEHaeh",
+		"expected": {1: 20, 2: 400, 3: 8902, 4: 197281}
+	},
+	"standard-promotions": {  # perft position 4 of the Chess Programming Wiki, up to the first depth with en passant
+		"notation": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w Aaeh",
+		"expected": {1: 6, 2: 264}
+	},
+	"standard-castling": {  # perft position 5 of the Chess Programming Wiki, which has no en passant up to depth 3
+		"notation": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w AEHah",
+		"expected": {1: 44, 2: 1486, 3: 62379}
+	},
+	"en": {
+		"notation": "a/rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR/A w AEHaeh",
+		"expected": {1: 21, 2: 441, 3: 10334}
+	},
+	"en-penetration": {  # the White Queen may capture through d6 to d7, and the Black Rook checks the White King through e5
+		"notation": "a/2b1k2r/pp1prp2/3n1a2/4P3/3Q4/2A2N2/PP3PPP/R3K3/1 w AEeh",
+		"expected": {1: 9, 2: 340, 3: 15599}
+	},
+	"en-stunted": {  # the White Rook and Bishop are next to Black Aurors only and move one square at a time
+		"notation": "1/3q2k1/5ppp/4a3/1a1R4/2B5/8/5PPP/6K1/A w -",
+		"expected": {1: 22, 2: 1092, 3: 27768}
+	},
+	"en-x-promotion": {  # pawns that have waited on the last rank, captures onto the "x" squares, and promotions to King or Auror
+		"notation": "a/2n1P3/3P4/1k6/8/8/8/P1p5/4p1K1/A w -",
+		"expected": {1: 26, 2: 625, 3: 14386}
+	},
+	"en-multiple-kings": {  # White's second King on c5 is in check from the Rook on c8
+		"notation": "a/2r1kb2/p4pp1/7k/2K5/8/8/PP4PP/3QK3/A w Ee",
+		"expected": {1: 4, 2: 118, 3: 4018}
+	},
+	"en-partial-checkmate": {  # White's King on a1 cannot escape the Rook while the King on h4 is safe: White loses a turn
+		"notation": "a/4k3/8/8/8/7K/8/PP6/K2r4/1 w e",
+		"expected": {1: 1, 2: 25, 3: 88}
+	}
+}
+
+
+def load_position(name):
+	"""new game (see `enchess.GameState`) from the stored position"""
+	return enchess.parse_position(POSITIONS[name]["notation"])
+
+
+def _pass_turn(state):
+	state.turn = ["White", "Black"][state.turn == "White"]
+
+
+def _lost_turn(state):
+	"""whether the player to move, having no possible moves, is in partial checkmate (and so only loses a turn)"""
+
+	king_count, checked = enchess._king_checks(state.turn, state)
+	return enchess._no_moves_result(king_count, len(checked)) == "partial checkmate"
+
+
+def perft(state, depth):
+	"""number of move sequences of the given length from the game (a turn lost to partial checkmate counts as one move)"""
+
+	if depth == 0:
+		return 1
+
+	moves = list(enchess._all_possible_moves(state))
+
+	if not moves:
+		if not _lost_turn(state):
+			return 0
+		_pass_turn(state)
+		nodes = perft(state, depth - 1)
+		_pass_turn(state)
+		return nodes
+
+	if depth == 1:
+		return len(moves)
+
+	nodes = 0
+	for piece, file, rank, interacting_pieces, *promote_class in moves:
+		undo = piece._make_move(file, rank, interacting_pieces, *promote_class, state=state)
+		_pass_turn(state)
+		nodes += perft(state, depth - 1)
+		_pass_turn(state)
+		enchess._unmake_move(undo, state)
+
+	return nodes
+
+
+def bitboard_perft(position, color, depth):
+	"""`perft` of the game as a `bitboard.BitboardPosition` with the given player to move"""
+
+	if depth == 0:
+		return 1
+
+	other_color = ["White", "Black"][color == "White"]
+	moves = list(position.legal_moves(color))
+
+	if not moves:
+		if enchess._no_moves_result(*position.king_checks(color)) != "partial checkmate":
+			return 0
+		return bitboard_perft(position, other_color, depth - 1)
+
+	if depth == 1:
+		return len(moves)
+
+	nodes = 0
+	for move in moves:
+		undo = position.make_move(*move)
+		nodes += bitboard_perft(position, other_color, depth - 1)
+		position.unmake_move(undo)
+
+	return nodes
+
+
+def divide(state, depth):
+	"""perft of each move from the game, as a {move description: node count} dictionary"""
+
+	counts = {}
+	moves = list(enchess._all_possible_moves(state))
+
+	if not moves and _lost_turn(state):
+		_pass_turn(state)
+		counts["(turn lost)"] = perft(state, depth - 1)
+		_pass_turn(state)
+
+	for piece, file, rank, interacting_pieces, *promote_class in moves:
+		description = enchess._move_notation(piece, file, rank, *promote_class)
+		undo = piece._make_move(file, rank, interacting_pieces, *promote_class, state=state)
+		_pass_turn(state)
+		counts[description] = perft(state, depth - 1)
+		_pass_turn(state)
+		enchess._unmake_move(undo, state)
+
+	return counts
+
+
+def run(names=None, max_depth=None, show_divide=False, backend="pieces"):
+	"""perft of the stored positions up to their deepest expected count (or `max_depth`) with the piece classes or the bitboard
+	backend, printing node counts and throughput; returns whether every count was as expected"""
+
+	all_ok = True
+
+	for name in names or POSITIONS:
+		expected = POSITIONS[name]["expected"]
+
+		for depth in range(1, (max_depth or max(expected)) + 1):
+			state = load_position(name)
+
+			start = time.perf_counter()
+			if backend == "bitboard":
+				nodes = bitboard_perft(bitboard.BitboardPosition(state.pieces, state.variant), state.turn, depth)
+			elif show_divide:
+				counts = divide(state, depth)
+				nodes = sum(counts.values())
+			else:
+				nodes = perft(state, depth)
+			seconds = time.perf_counter() - start
+
+			if show_divide and backend != "bitboard":
+				for description, count in sorted(counts.items()):
+					print(f"\t{description}: {count}")
+
+			status = ""
+			if depth in expected:
+				status = "ok" if nodes == expected[depth] else f"MISMATCH (expected {expected[depth]})"
+				all_ok = all_ok and nodes == expected[depth]
+			print(f"{name} depth {depth}: {nodes} nodes in {seconds:.2f} s ({nodes / seconds:,.0f} nodes/s) {status}")
+
+	return all_ok
+
+
+def _move_squares(piece, file, rank, interacting_pieces, *promote_class):
+	"""(origin index, destination index, interacting squares mask, promote class) of the move as `bitboard.BitboardPosition`
+	lists it, a King-Auror swap being a move of the King"""
+
+	origin, target = enchess.SQUARE_INDEX[(piece.file, piece.rank)], enchess.SQUARE_INDEX[(file, rank)]
+	interacting = 0
+	for interacting_piece in interacting_pieces:
+		interacting |= 1 << enchess.SQUARE_INDEX[(interacting_piece.file, interacting_piece.rank)]
+
+	if isinstance(piece, enchess.Auror) and interacting_pieces:
+		origin, target, interacting = target, origin, 1 << origin
+
+	return origin, target, interacting, promote_class[0] if promote_class else None
+
+
+def _compare_backends(state, position, depth, path):
+	"""list of the positions (as move paths) down to the given depth where the bitboard moves differ from the piece classes'"""
+
+	expected = {_move_squares(*move): move for move in enchess._all_possible_moves(state)}
+	moves = {(*move, None)[:4] for move in position.legal_moves(state.turn)}
+	mismatches = [] if moves == set(expected) else [path]
+
+	if depth > 1:
+		for squares, (piece, file, rank, interacting_pieces, *promote_class) in expected.items():
+			notation = enchess._move_notation(piece, file, rank, *promote_class)
+			undo = piece._make_move(file, rank, interacting_pieces, *promote_class, state=state)
+			bitboard_undo = position.make_move(*squares)
+			_pass_turn(state)
+			mismatches += _compare_backends(state, position, depth - 1, path + [notation])
+			_pass_turn(state)
+			position.unmake_move(bitboard_undo)
+			enchess._unmake_move(undo, state)
+
+	return mismatches
+
+
+def check_bitboard(names=None, depth=2):
+	"""compare the legal moves of the bitboard backend with those of the piece classes in every position down to the given
+	depth from the stored positions, printing the paths to any that differ; returns whether none did"""
+
+	all_ok = True
+
+	for name in names or POSITIONS:
+		state = load_position(name)
+		mismatches = _compare_backends(state, bitboard.BitboardPosition(state.pieces, state.variant), depth, [])
+		all_ok = all_ok and not mismatches
+
+		print(f"{name} to depth {depth}: {'ok' if not mismatches else f'{len(mismatches)} MISMATCHES'}")
+		for path in mismatches[:10]:
+			print(f"\t{' '.join(path) or '(start)'}")
+
+	return all_ok
+
+
+def _legality_mismatches(state):
+	"""moves of the player to move whose legality as decided from the attack map (`Piece._legality`) differs from what making
+	them tells (`Piece._resulting_checks`), with the number of moves decided from the attack map"""
+
+	checked = enchess._king_checks(state.turn, state)[1]
+	mismatches = []
+	decided = 0
+
+	for piece in sorted(state.pieces, key=lambda piece: enchess.SQUARE_INDEX[(piece.file, piece.rank)]):
+		if piece.color != state.turn:
+			continue
+
+		for move in list(piece._normally_possible_moves(state=state)):
+			legal = piece._legality(checked, *move, state=state)
+			if legal is None:
+				continue
+			decided += 1
+
+			check_count = sum(
+				1 for king, check in piece._resulting_checks(*move, state=state) if check and king.color == piece.color)
+			if legal != (check_count < len(checked) or check_count == 0):
+				mismatches.append(enchess._move_notation(piece, *move[:2], *move[3:]))
+
+	return mismatches, decided
+
+
+def check_legality(names=None, games=10, plies=80):
+	"""play the given number of random games (the same ones every time) of up to `plies` moves from each stored position and
+	compare, for every move of every position reached, the legality found from the attack map with the legality found by
+	making the move; prints the positions where they differ and returns whether none did"""
+
+	all_ok = True
+
+	for name in names or POSITIONS:
+		decided = 0
+		mismatch_count = 0
+
+		for game in range(games):
+			rng = random.Random(game)
+			state = load_position(name)
+
+			for _ in range(plies):
+				mismatches, position_decided = _legality_mismatches(state)
+				decided += position_decided
+
+				if mismatches:
+					mismatch_count += len(mismatches)
+					print(f"\t{enchess.position_notation(state)}: {', '.join(mismatches)}")
+
+				moves = list(enchess._all_possible_moves(state))
+				if moves:
+					piece, file, rank, interacting_pieces, *promote_class = rng.choice(moves)
+					piece._make_move(file, rank, interacting_pieces, *promote_class, state=state)
+				elif not _lost_turn(state):
+					break
+				_pass_turn(state)
+
+		all_ok = all_ok and not mismatch_count
+		print(f"{name}, {games} games: {decided} moves decided from the attack map "
+			f"{'ok' if not mismatch_count else f'with {mismatch_count} MISMATCHES'}")
+
+	return all_ok
+
+
+# positions that `enchess.parse_position` must refuse, each with what is wrong with it
+INVALID_NOTATIONS = {
+	"P/rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR/A w -": "White Pawn on x9",
+	"a/rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR/p w -": "Black Pawn on x0",
+	"a/rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR/R w -": "White Rook on x0",
+	"r/rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR/A w -": "Black Rook on x9",
+	"a/rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNP/A w -": "White Pawn on its own back rank",
+	"a/rnbqkbnp/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR/A w -": "Black Pawn on its own back rank",
+	"rnbqkbnP/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w -": "standard Pawn on the last rank",
+	"4k3/8/8/8/8/8/8/R2K4 w AD": "unmoved King off its starting square",
+	"4k3/8/8/8/8/8/8/R3K3 w ZZZ": "unknown letters for unmoved pieces",
+	"4k3/8/8/8/8/8/8/4K3 w A": "unmoved Rook missing",
+}
+
+
+def check_notation():
+	"""check that every one of `INVALID_NOTATIONS` is refused; returns whether all were"""
+
+	all_ok = True
+
+	for notation, description in INVALID_NOTATIONS.items():
+		try:
+			enchess.parse_position(notation)
+		except ValueError:
+			ok = True
+		else:
+			ok = False
+		all_ok = all_ok and ok
+		print(f"{description}: {'ok' if ok else 'NOT REFUSED'}")
+
+	return all_ok
+
+
+def check_search(node_limits=(500, 20000), workers=(1, 2)):
+	"""search the EN start position under each node budget, serially and split between each number of worker processes,
+	printing the nodes and depth reached; returns whether no search went over its budget"""
+
+	all_ok = True
+	state = enchess.GameState("en")
+
+	for node_limit in node_limits:
+		runs = [("serial", lambda: engine.search(node_limit=node_limit, state=state))]
+		runs += [(f"{count} workers", lambda count=count: engine.parallel_search(node_limit=node_limit, workers=count, state=state))
+			for count in workers]
+
+		for description, run_search in runs:
+			results = run_search()
+			ok = results["nodes"] <= node_limit
+			all_ok = all_ok and ok
+			print(f"search of {node_limit} nodes, {description}: {results['nodes']} nodes to depth {results['depth']} "
+				f"{'ok' if ok else 'OVER BUDGET'}")
+
+	return all_ok
+
+
+if __name__ == "__main__":
+	import argparse
+	import sys
+
+	parser = argparse.ArgumentParser(description="Count move-generation nodes of stored positions and report throughput.")
+	parser.add_argument("positions", nargs="*", metavar="position", help=f"any of {', '.join(POSITIONS)} (default: all)")
+	parser.add_argument("--depth", type=int, help="maximum depth (default: deepest expected count of each position)")
+	parser.add_argument("--divide", action="store_true", help="list the node count below each move (piece classes only)")
+	parser.add_argument("--backend", choices=("pieces", "bitboard"), default="pieces",
+		help="move generation by the piece classes of enchess (default) or by bitboard.py")
+	parser.add_argument("--check-bitboard", action="store_true",
+		help="compare the legal moves of both backends down to --depth (default 2) instead")
+	parser.add_argument("--check-legality", action="store_true",
+		help="compare the legality of moves found from the attack map with the legality found by making them, over random games, instead")
+	parser.add_argument("--games", type=int, default=10, help="random games per position for --check-legality (default: 10)")
+	parser.add_argument("--check-notation", action="store_true",
+		help="check that invalid positions are refused instead")
+	parser.add_argument("--check-search", action="store_true", help="check that searches keep to their node budget instead")
+	args = parser.parse_args()
+
+	if args.check_legality:
+		sys.exit(0 if check_legality(args.positions, args.games) else 1)
+	if args.check_notation:
+		sys.exit(0 if check_notation() else 1)
+	if args.check_search:
+		sys.exit(0 if check_search() else 1)
+	if args.check_bitboard:
+		sys.exit(0 if check_bitboard(args.positions, args.depth or 2) else 1)
+
+	for name in args.positions:
+		if name not in POSITIONS:
+			parser.error(f"unknown position {name!r}")
+
+	sys.exit(0 if run(args.positions, args.depth, args.divide, args.backend) else 1)
@@ -0,0 +1,180 @@
+"""
+Line protocol for driving the engine from another program, modelled on UCI: one command per line on standard input, and
+replies on standard output with no board display. Moves are written as in game records (see `records.py`).
+
+	uci                                           id lines, then "uciok"
+	isready                                       "readyok"
+	ucinewgame                                    forget the previous searches and go back to the EN start
+	position startpos [en|standard] [moves ...]   the start of the variant (EN by default), then the moves
+	position notation <notation> [moves ...]      a position in notation (see `enchess.position_notation`), then the moves
+	moves                                         "moves" and the possible moves of the player to move
+	status                                        "status ongoing", "status stalemate", "status partial-checkmate", or
+	                                              "status checkmate"
+	notation                                      "notation" and the position in notation
+	go [depth N] [movetime MS] [nodes N]          "info" with the search results, then "bestmove" and the move, or
+	                                              "bestmove none" and why
+	quit
+
+A command that cannot be carried out is answered by "error" and the reason. Run `python3 enchess.py --protocol` (or
+`python3 protocol.py`) to start.
+"""
+
+import sys
+
+import enchess
+import engine
+import records
+
+
+class Protocol:
+	"""a game and transposition table driven by protocol commands"""
+
+	def __init__(self):
+		self.state = enchess.GameState("en")
+		self.table = enchess.TranspositionTable()
+
+	def handle(self, line):
+		"""reply lines to the command line; raises ValueError if the command cannot be carried out"""
+
+		command, *args = line.split() or [""]
+
+		if command == "uci":
+			return ["id name EN-Chess", "id author Eric Nordstrom", "uciok"]
+
+		if command == "isready":
+			return ["readyok"]
+
+		if command == "ucinewgame":
+			self.state = enchess.GameState("en")
+			self.table.clear()
+			return []
+
+		if command == "position":
+			self.state = self._position(args)
+			return []
+
+		if command == "moves":
+			return [" ".join(["moves", *map(records.move_token, enchess._all_possible_move_codes(self.state))])]
+
+		if command == "status":
+			return ["status " + enchess.game_status(self.state).replace(" ", "-")]
+
+		if command == "notation":
+			return ["notation " + enchess.position_notation(self.state)]
+
+		if command == "go":
+			return self._go(args)
+
+		if command == "":
+			return []
+
+		raise ValueError(f"unknown command {command!r}")
+
+	def _position(self, args):
+
+		if "moves" in args:
+			moves = args[args.index("moves") + 1:]
+			args = args[:args.index("moves")]
+		else:
+			moves = []
+
+		if args[:1] == ["startpos"] and len(args) <= 2:
+			variant = args[1] if len(args) == 2 else "en"
+			if variant not in enchess.BOARDS:
+				raise ValueError(f"unknown variant {variant!r}")
+			state = enchess.GameState(variant)
+		elif args[:1] == ["notation"]:
+			state = enchess.parse_position(" ".join(args[1:]))
+		else:
+			raise ValueError("expected position startpos or position notation")
+
+		for token in moves:
+			records.play_token(token, state)
+
+		return state
+
+	def _go(self, args):
+
+		limits = {"depth": None, "movetime": None, "nodes": None}
+
+		if len(args) % 2:
+			raise ValueError("expected go followed by limits and their values")
+
+		for name, value in zip(args[::2], args[1::2]):
+			if name not in limits or not value.isdigit():
+				raise ValueError(f"bad limit {name} {value}")
+			limits[name] = int(value)
+
+		results = engine.search(
+			limits["depth"], None if limits["movetime"] is None else limits["movetime"] / 1000, limits["nodes"], self.table,
+			self.state)
+
+		if results["move"] is None:
+			return ["bestmove none " + results["result"].replace(" ", "-")]
+
+		# in centipawns, or in moves to mate (negative when being mated)
+		score = results["score"]
+		if abs(score) > engine.MATE_BOUND:
+			moves_to_mate = (engine.MATE - abs(score) + 1) // 2
+			score = f"mate {moves_to_mate if score > 0 else -moves_to_mate}"
+		else:
+			score = f"cp {score}"
+
+		return [
+			f"info depth {results['depth']} score {score} nodes {results['nodes']} time {round(results['seconds'] * 1000)} "
+			f"pv {' '.join(self._pv_tokens(results['pv']))}",
+			"bestmove " + records.move_token(enchess._encode_move(*results["move"]))]
+
+	def _pv_tokens(self, pv):
+		"""the principal variation (see `engine.Search.run`) written as in game records, found by playing it out"""
+
+		state = self.state
+		turn = state.turn
+		undo_entries = []
+		tokens = []
+
+		for notation in pv:
+
+			if notation is None:
+				tokens.append(records.LOST_TURN)
+
+			else:
+				for move in enchess._all_possible_moves(state):
+					if enchess._move_notation(*move[:3], *move[4:]) == notation:
+						tokens.append(records.move_token(enchess._encode_move(*move)))
+						undo_entries.append(move[0]._make_move(*move[1:], state=state))
+						break
+				else:
+					break
+
+			state.turn = ["White", "Black"][state.turn == "White"]
+
+		for undo_entry in reversed(undo_entries):
+			enchess._unmake_move(undo_entry, state)
+		state.turn = turn
+
+		return tokens
+
+
+def main(lines=sys.stdin, output=sys.stdout):
+	"""answer the commands of the lines until "quit" or the end, flushing the output after each one"""
+
+	protocol = Protocol()
+
+	for line in lines:
+
+		if line.strip() == "quit":
+			break
+
+		try:
+			replies = protocol.handle(line)
+		except ValueError as e:
+			replies = [f"error {e}"]
+
+		for reply in replies:
+			print(reply, file=output)
+		output.flush()
+
+
+if __name__ == "__main__":
+	main()
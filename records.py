@@ -0,0 +1,294 @@
+"""
+Game records in a PGN-like format, and a quiet replay that validates them in bulk (e.g. after a rule change).
+
+A record is a few header lines, such as `[Variant "en"]`, `[Position "..."]` (in the notation of `enchess.position_notation`,
+for games not played from the start) and `[Result "1-0"]`, followed by the moves:
+
+	1. d2-d4 e7-e5 2. d4xe5 d8xxd1 ...
+
+A move is its from and to squares joined by "-" (a quiet move or castling), "x" (one capture), "xx" (a Penetration-mode double
+capture) or "<>" (a King-Auror swap), then "=" and the letter of the promote class if any ("e8=A" promotes a Pawn waiting on
+its last rank). "--" is a turn lost to partial checkmate. A record ends with its result: "1-0", "0-1", "1/2-1/2" (stalemate),
+or "*" (unfinished).
+
+Run `python3 records.py FILE...` to validate every record of the files; see `python3 records.py --help` for options.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+import re
+import time
+
+import enchess
+from enchess import SQUARES, SQUARE_INDEX, PIECE_LETTERS, PIECE_TYPES
+
+
+SEPARATORS = {
+	enchess.MOVE_QUIET: "-", enchess.MOVE_CASTLE: "-", enchess.MOVE_CAPTURE: "x", enchess.MOVE_DOUBLE_CAPTURE: "xx",
+	enchess.MOVE_SWAP: "<>"
+}
+LOST_TURN = "--"
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+HEADER_PATTERN = re.compile(r'\[(\w+) "(.*)"\]$')
+MOVE_PATTERN = re.compile(r"([a-hx]\d)(?:(-|xx|x|<>)([a-hx]\d))?(?:=([PRNBQKA]))?$")
+MOVE_NUMBER_PATTERN = re.compile(r"\d+\.+$")
+
+
+def move_token(code):
+	"""the encoded move (see `enchess._encode_move`) as written in records"""
+
+	origin = "{}{}".format(*SQUARES[code & 127])
+	destination = "{}{}".format(*SQUARES[code >> 7 & 127])
+	promote_class = enchess._move_promote_class(code)
+
+	token = origin if origin == destination else origin + SEPARATORS[enchess._move_kind(code)] + destination
+
+	if promote_class:
+		token += "=" + PIECE_LETTERS[PIECE_TYPES.index(promote_class)]
+
+	return token
+
+
+def game_result(state):
+	"""result of the game as written in records"""
+
+	status = enchess.game_status(state)
+
+	if status == "checkmate":
+		return "0-1" if state.turn == "White" else "1-0"
+
+	if status == "stalemate":
+		return "1/2-1/2"
+
+	return "*"
+
+
+def game_record(state="current", **headers):
+	"""the moves played in the game (see `enchess.GameState.history`) as a record, with the given headers"""
+
+	if state == "current":
+		state = enchess.state
+
+	headers = {"Variant": state.variant, **headers}
+	if state.start_notation != enchess.position_notation(enchess.GameState(state.variant)):
+		headers["Position"] = state.start_notation
+	headers["Result"] = result = game_result(state)
+
+	plies = []  # (player, token)
+	for code, _, previous_turn, turn, _ in state.history:
+		plies.append((previous_turn, move_token(code)))
+		if turn == previous_turn:  # the other player lost a turn to partial checkmate
+			plies.append((["White", "Black"][previous_turn == "White"], LOST_TURN))
+
+	tokens = []
+	move_number = 1
+
+	for player, token in plies:
+
+		if player == "White":
+			tokens.append(f"{move_number}.")
+		elif not tokens:
+			tokens.append(f"{move_number}...")
+
+		tokens.append(token)
+		if player == "Black":
+			move_number += 1
+
+	tokens.append(result)
+
+	return "".join(f'[{name} "{value}"]\n' for name, value in headers.items()) + "\n" + " ".join(tokens) + "\n"
+
+
+def read_records(lines, name=""):
+	"""(headers, move tokens, location) of each record of the lines (e.g. an open file), read as they are needed; the location is
+	the name and line number of the record's first line"""
+
+	headers = {}
+	tokens = []
+	location = None
+
+	for line_number, line in enumerate(lines, 1):
+
+		line = line.strip()
+		if not line:
+			continue
+
+		header = HEADER_PATTERN.match(line)
+
+		if header:
+			if tokens:
+				yield headers, tokens, location
+				headers, tokens, location = {}, [], None
+			headers[header[1]] = header[2]
+
+		else:
+			tokens.extend(token for token in line.split() if not MOVE_NUMBER_PATTERN.match(token))
+
+		if location is None:
+			location = f"{name}:{line_number}"
+
+		if tokens and tokens[-1] in RESULTS:
+			yield headers, tokens, location
+			headers, tokens, location = {}, [], None
+
+	if headers or tokens:
+		yield headers, tokens, location
+
+
+def _find_move(token, state):
+	"""(piece, file, rank, interacting_pieces, *promote_class) of the possible move written as the token, or None"""
+
+	match = MOVE_PATTERN.match(token)
+	if not match:
+		return None
+
+	origin, separator, destination, promote_letter = match.groups()
+	origin = origin[0], int(origin[1])
+	destination = (destination[0], int(destination[1])) if destination else origin
+	promote_class = PIECE_TYPES[PIECE_LETTERS.index(promote_letter)] if promote_letter else None
+
+	piece = state.board.get(origin)
+	if not piece or piece.color != state.turn or separator is None and not promote_class:
+		return None
+
+	# only the move written is tested for legality
+	for move in piece._normally_possible_moves(state):
+		code = enchess._encode_move(piece, *move)
+		if code >> 7 & 127 == SQUARE_INDEX[destination] and enchess._move_promote_class(code) is promote_class\
+			and SEPARATORS[enchess._move_kind(code)] == (separator or "-"):
+			if piece._is_legal(enchess._king_checks(piece.color, state)[1], *move, state=state):
+				return piece, *move
+
+
+def play_token(token, state):
+	"""Play the move written as the token (or pass a turn lost to partial checkmate) in the game, without output; raises
+	ValueError if it is not possible."""
+
+	if token == LOST_TURN:
+		if enchess.game_status(state) != "partial checkmate":
+			raise ValueError(f"{state.turn} has not lost a turn")
+
+	else:
+		move = _find_move(token, state)
+		if move is None:
+			raise ValueError(f"{token} is not possible for {state.turn}")
+
+		piece, *move = move
+		piece._make_move(*move, state=state)
+
+	state.turn = ["White", "Black"][state.turn == "White"]
+
+
+def replay(record):
+	"""Play the moves of the record (see `read_records`) without output and return a dict of its location, the number of moves
+	played, the result reached, and what was wrong with the record (None if every move was possible and the game reached the
+	recorded result)."""
+
+	headers, tokens, location = record
+	report = {"location": location, "moves": 0, "result": None, "error": None}
+
+	try:
+		if "Position" in headers:
+			state = enchess.parse_position(headers["Position"])
+		else:
+			state = enchess.GameState(headers.get("Variant", "en"))
+	except (KeyError, ValueError) as e:
+		report["error"] = f"bad position: {e}"
+		return report
+
+	recorded_result = headers.get("Result")
+
+	for token in tokens:
+
+		if token in RESULTS:
+			recorded_result = token
+			break
+
+		try:
+			play_token(token, state)
+		except ValueError as e:
+			report["error"] = f"move {report['moves'] + 1}: {e}"
+			return report
+
+		report["moves"] += 1
+
+	report["result"] = game_result(state)
+
+	if recorded_result not in {None, "*", report["result"]}:
+		report["error"] = f"recorded result {recorded_result}, but the game ends {report['result']}"
+
+	return report
+
+
+def _replay_batch(records):
+	return [replay(record) for record in records]
+
+
+def replay_all(records, workers=1, batch_size=64):
+	"""`replay` of each record, in order, split between worker processes in batches if more than one; records are read only a
+	few batches ahead"""
+
+	records = iter(records)
+
+	if workers == 1:
+		for record in records:
+			yield replay(record)
+		return
+
+	with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+
+		pending = collections.deque()
+
+		for batch in iter(lambda: list(itertools.islice(records, batch_size)), []):
+			pending.append(executor.submit(_replay_batch, batch))
+			if len(pending) > 2 * workers:
+				yield from pending.popleft().result()
+
+		while pending:
+			yield from pending.popleft().result()
+
+
+def validate(paths, workers=1, show_all=False):
+	"""replay every record of the files, printing each problem (or each report) and the throughput; returns whether every
+	record was valid"""
+
+	def all_records():
+		for path in paths:
+			with open(path) as lines:
+				yield from read_records(lines, path)
+
+	games = moves = invalid = 0
+	start = time.perf_counter()
+
+	for report in replay_all(all_records(), workers):
+
+		games += 1
+		moves += report["moves"]
+
+		if report["error"]:
+			invalid += 1
+			print(f"{report['location']}: {report['error']}")
+		elif show_all:
+			print(f"{report['location']}: {report['moves']} moves, {report['result']}")
+
+	seconds = time.perf_counter() - start
+	print(f"{games} games ({invalid} invalid), {moves} moves in {seconds:.2f} s "
+		f"({games / seconds:,.0f} games/s, {moves / seconds:,.0f} moves/s)")
+
+	return invalid == 0
+
+
+if __name__ == "__main__":
+	import argparse
+	import sys
+
+	parser = argparse.ArgumentParser(description="Replay the game records of the files, reporting impossible moves and results.")
+	parser.add_argument("paths", nargs="+", metavar="file", help="file of game records")
+	parser.add_argument("--workers", type=int, default=1, help=f"worker processes (default: 1; this machine has {os.cpu_count()} cores)")
+	parser.add_argument("--all", action="store_true", help="report every record, not only those with problems")
+	args = parser.parse_args()
+
+	sys.exit(0 if validate(args.paths, max(args.workers, 1), args.all) else 1)
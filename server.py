@@ -0,0 +1,317 @@
+"""
+Server holding many games at once for clients on the local machine: asyncio over TCP, one JSON message per line.
+
+Clients send messages with an "op":
+
+	{"op": "new", "variant": "en"}               start a game (or from a position: "notation", see `enchess.position_notation`)
+	{"op": "join", "game": 1, "color": "White"}  follow a game, taking the seat of a player if "color" is given
+	{"op": "move", "game": 1, "move": "e2-e4"}   play a move, written as in game records (see `records.py`)
+	{"op": "moves", "game": 1}                   list the possible moves
+	{"op": "games"}                              list the games
+
+"new" and "join" are answered by the whole game ({"type": "game", ...}); after that, everyone following the game is sent only
+what each move changed ({"type": "moved", "changes": {square: piece letter or null}, ...}). A move by a client not in the
+player's seat is refused while the seat is taken. Anything wrong is answered by {"type": "error", "message": ...}.
+
+Moves are checked, and the end of the game detected, in worker processes, so that a slow position does not hold up the
+other games. Run `python3 server.py` to serve; `Client` stands in for a client, e.g. to try the server out.
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+
+import enchess
+import records
+
+
+class _WorkerError(Exception):
+	"""raised when a worker process fails to answer (crashing or raising an unexpected error)"""
+
+
+def _init_worker(move_cache_size):
+	if move_cache_size is not None:
+		enchess.move_cache.resize(move_cache_size)
+
+
+def _occupants(state):
+	"""piece letter (see `enchess.NOTATION_LETTERS`) or None for each square of the game's board, as "e4" and so on"""
+	return {
+		f"{file}{rank}": None if piece is None else enchess.NOTATION_LETTERS[(type(piece), piece.color)]
+		for (file, rank), piece in state.board.items()}
+
+
+def _play(notation, token):
+	"""(notation after the move written as the token, changed squares, game status, whether the other player lost a turn) from
+	the position; raises ValueError if the move is not possible"""
+
+	state = enchess.parse_position(notation)
+	before = _occupants(state)
+
+	records.play_token(token, state)
+	status = enchess.game_status(state)
+
+	# as in `enchess.move`, a player in partial checkmate loses a turn
+	lost_turn = status == "partial checkmate"
+	if lost_turn:
+		records.play_token(records.LOST_TURN, state)
+		status = enchess.game_status(state)
+
+	after = _occupants(state)
+	changes = {square: occupant for square, occupant in after.items() if occupant != before[square]}
+
+	return enchess.position_notation(state), changes, status, lost_turn
+
+
+def _possible_moves(notation):
+	state = enchess.parse_position(notation)
+	return [records.move_token(code) for code in enchess._all_possible_move_codes(state)]
+
+
+def _status(notation):
+	return enchess.game_status(enchess.parse_position(notation))
+
+
+class Game:
+	"""a game held by the server: its position in notation, the moves played, the clients following it, and the seats"""
+
+	def __init__(self, game_id, notation, status):
+		self.id = game_id
+		self.notation = notation
+		self.status = status
+		self.moves = []
+		self.seats = {"White": None, "Black": None}  # color: client writer
+		self.followers = set()
+		self.lock = asyncio.Lock()  # moves of one game are checked one at a time
+
+	def turn(self):
+		return "White" if self.notation.split()[1] == "w" else "Black"
+
+	def message(self):
+		return {
+			"type": "game", "game": self.id, "notation": self.notation, "moves": self.moves, "turn": self.turn(),
+			"status": self.status, "seats": {color: writer is not None for color, writer in self.seats.items()}}
+
+
+class GameServer:
+	"""games in memory, served to clients of a local socket, with moves checked in worker processes (one per core by default),
+	each keeping the possible moves of up to `move_cache_size` positions (see `enchess.MoveCache`)"""
+
+	def __init__(self, workers=None, move_cache_size=None):
+		self.games = {}
+		self.game_ids = itertools.count(1)
+		self.workers = workers or os.cpu_count() or 1
+		self.move_cache_size = move_cache_size
+		self.executor = self._new_executor()
+
+	def _new_executor(self):
+
+		# started afresh rather than forked, so that they do not hold copies of the connections open
+		return concurrent.futures.ProcessPoolExecutor(
+			self.workers, multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=(self.move_cache_size,))
+
+	async def start(self, host="127.0.0.1", port=0):
+		"""start serving and return the `asyncio.Server` (port 0 picks a free port; see its `sockets`)"""
+		return await asyncio.start_server(self._serve, host, port)
+
+	def close(self):
+		self.executor.shutdown(cancel_futures=True)
+
+	async def _run(self, function, *args):
+
+		executor = self.executor
+
+		try:
+			return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+		except (ValueError, KeyError, TypeError):
+			raise
+
+		except concurrent.futures.BrokenExecutor as e:
+			# a worker died, and the pool with it: start a new one (once, however many requests were waiting) for the games to go on
+			if self.executor is executor:
+				self.executor = self._new_executor()
+				executor.shutdown(wait=False, cancel_futures=True)
+			raise _WorkerError("a worker process failed; try again") from e
+
+		except Exception as e:
+			raise _WorkerError(f"a worker process failed: {e!r}") from e
+
+	async def _serve(self, reader, writer):
+
+		try:
+			async for line in reader:
+				try:
+					reply = await self._handle(json.loads(line), writer)
+				except (ValueError, KeyError, TypeError, _WorkerError) as e:
+					reply = {"type": "error", "message": str(e)}
+				if reply is not None:
+					await self._send(writer, reply)
+
+		except ConnectionError:
+			pass
+
+		finally:
+			for game in self.games.values():
+				game.followers.discard(writer)
+				for color, seated in game.seats.items():
+					if seated is writer:
+						game.seats[color] = None
+			writer.close()
+
+	async def _send(self, writer, message):
+		writer.write(json.dumps(message).encode() + b"\n")
+		await writer.drain()
+
+	def _game(self, message):
+
+		game = self.games.get(message["game"])
+		if game is None:
+			raise ValueError(f"no game {message['game']!r}")
+
+		return game
+
+	async def _handle(self, message, writer):
+		"""reply to the client's message (None if it is answered by a message to all followers of a game)"""
+
+		op = message["op"]
+
+		if op == "new":
+			notation, variant, color = message.get("notation"), message.get("variant", "en"), message.get("color")
+
+			# checked here, so that a bad request is answered as one and leaves no game behind
+			if not isinstance(notation, (str, type(None))) or not isinstance(variant, str):
+				raise ValueError("notation and variant must be strings")
+			if variant.lower() not in enchess.BOARDS:
+				raise ValueError(f"no variant {variant!r}")
+			if color is not None and color not in {"White", "Black"}:
+				raise ValueError(f"no color {color!r}")
+
+			notation = notation or enchess.position_notation(enchess.GameState(variant))
+			status = await self._run(_status, notation)
+			game = Game(next(self.game_ids), notation, status)
+			reply = self._join(game, color, writer)
+			self.games[game.id] = game
+			return reply
+
+		if op == "join":
+			return self._join(self._game(message), message.get("color"), writer)
+
+		if op == "moves":
+			game = self._game(message)
+			return {"type": "moves", "game": game.id, "moves": await self._run(_possible_moves, game.notation)}
+
+		if op == "games":
+			return {"type": "games", "games": [{"game": game.id, "status": game.status} for game in self.games.values()]}
+
+		if op == "move":
+			return await self._move(self._game(message), message["move"], writer)
+
+		raise ValueError(f"unknown op {op!r}")
+
+	def _join(self, game, color, writer):
+
+		if color is not None:
+			if color not in game.seats:
+				raise ValueError(f"no color {color!r}")
+			if game.seats[color] not in {None, writer}:
+				raise ValueError(f"{color}'s seat is taken")
+			game.seats[color] = writer
+
+		game.followers.add(writer)
+		return game.message()
+
+	async def _move(self, game, token, writer):
+
+		if writer not in game.followers:
+			raise ValueError("join the game first")
+
+		async with game.lock:
+
+			if game.status in {"checkmate", "stalemate"}:
+				raise ValueError(f"the game is over by {game.status}")
+
+			turn = game.turn()
+			if game.seats[turn] not in {None, writer}:
+				raise ValueError(f"{turn}'s seat is taken by another client")
+
+			notation, changes, status, lost_turn = await self._run(_play, game.notation, token)
+
+			game.notation = notation
+			game.status = status
+			game.moves.append(token)
+			if lost_turn:
+				game.moves.append(records.LOST_TURN)
+
+			update = {
+				"type": "moved", "game": game.id, "move": token, "lost_turn": lost_turn, "changes": changes,
+				"turn": game.turn(), "status": status, "ply": len(game.moves)}
+
+		for follower in list(game.followers):
+			try:
+				await self._send(follower, update)
+			except ConnectionError:
+				game.followers.discard(follower)
+
+
+class Client:
+	"""stand-in for a client of a `GameServer`: sends messages and reads what the server sends, in order"""
+
+	def __init__(self, reader, writer):
+		self.reader = reader
+		self.writer = writer
+
+	@classmethod
+	async def connect(cls, host="127.0.0.1", port=8765):
+		return cls(*await asyncio.open_connection(host, port))
+
+	async def send(self, op, **fields):
+		self.writer.write(json.dumps({"op": op, **fields}).encode() + b"\n")
+		await self.writer.drain()
+
+	async def receive(self):
+		"""the next message from the server"""
+		return json.loads(await self.reader.readline())
+
+	async def request(self, op, **fields):
+		"""send a message and return the next message from the server (its reply, unless another message came first)"""
+
+		await self.send(op, **fields)
+		return await self.receive()
+
+	async def close(self):
+		self.writer.close()
+		await self.writer.wait_closed()
+
+
+async def serve(host="127.0.0.1", port=8765, workers=None, move_cache_size=None):
+	"""serve games until cancelled"""
+
+	game_server = GameServer(workers, move_cache_size)
+
+	try:
+		server = await game_server.start(host, port)
+		async with server:
+			print(f"Serving games on {host}:{port}")
+			await server.serve_forever()
+	finally:
+		game_server.close()
+
+
+if __name__ == "__main__":
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Hold games for clients on this machine (one JSON message per line over TCP).")
+	parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+	parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+	parser.add_argument("--workers", type=int, help="worker processes checking moves (default: one per core)")
+	parser.add_argument("--move-cache-size", type=int, help="positions whose moves each worker keeps (default: 256)")
+	args = parser.parse_args()
+
+	try:
+		asyncio.run(serve(args.host, args.port, args.workers, args.move_cache_size))
+	except KeyboardInterrupt:
+		pass